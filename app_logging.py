@@ -0,0 +1,96 @@
+import json
+import time
+import queue
+import atexit
+import logging
+import contextlib
+import contextvars
+import logging.handlers
+
+# Job the current thread works on, added to every record it logs
+current_job_id = contextvars.ContextVar("current_job_id", default=None)
+
+_listener = None
+
+@contextlib.contextmanager
+def job_context(job_id):
+    token = current_job_id.set(job_id)
+    try:
+        yield
+    finally:
+        current_job_id.reset(token)
+
+class JobContextFilter(logging.Filter):
+    def filter(self, record):
+        record.job_id = current_job_id.get()
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread as they are.
+
+    The stock QueueHandler formats the message in the logging thread; here
+    the %-formatting, the JSON encoding and the file write all happen on
+    the writer thread. A full queue drops the record instead of making a
+    download worker wait for the disk.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, thread, job_id and message."""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+        }
+        job_id = getattr(record, "job_id", None)
+        if job_id:
+            entry["job_id"] = job_id
+        entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging(path, level=logging.INFO, max_bytes=5 * 1024 * 1024, backups=3, queue_size=10000):
+    """Routes the root logger through a bounded queue to a rotating JSON-lines file.
+
+    Returns the queue handler, whose dropped count tells how many records
+    did not fit in the queue.
+    """
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(JobContextFilter())
+    global _listener
+    _listener = logging.handlers.QueueListener(handler.queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    # Writes out what is still queued on a normal exit
+    atexit.register(stop_logging)
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
+
+def stop_logging():
+    """Writes out the queued records and stops the writer thread; call before os._exit(), which skips atexit."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
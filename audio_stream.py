@@ -0,0 +1,59 @@
+import os
+import time
+import shutil
+import subprocess
+
+# Bytes read from the network per write into ffmpeg's stdin
+CHUNK_SIZE = 256 * 1024
+
+def is_streamable(info):
+    """True for a single progressive HTTP(S) format, the only kind that can be piped as it arrives."""
+    return (info.get('protocol') in ('http', 'https') and bool(info.get('url'))
+            and not info.get('requested_formats') and not info.get('fragments'))
+
+def stream_to_mp3(response, target, progress=None, bitrate='192k', total=None):
+    """Pipes an open HTTP response through ffmpeg into an mp3 file.
+
+    Encoding overlaps with the download and only the encoded file touches
+    the disk, written to target + '.part' and renamed when ffmpeg succeeds.
+    progress(downloaded, total, speed) is called after every chunk and may
+    raise to abort; the partial output is removed in that case.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg not found")
+    part = f"{target}.part"
+    proc = subprocess.Popen(
+        [ffmpeg, '-y', '-nostdin', '-loglevel', 'error', '-i', 'pipe:0', '-vn',
+         '-codec:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', part],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    try:
+        start = time.monotonic()
+        downloaded = 0
+        while True:
+            chunk = response.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            try:
+                proc.stdin.write(chunk)
+            except (BrokenPipeError, OSError):
+                break # ffmpeg gave up, its exit code tells why
+            downloaded += len(chunk)
+            if progress:
+                progress(downloaded, total, downloaded / max(time.monotonic() - start, 1e-6))
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        stderr = proc.stderr.read().decode('utf-8', 'replace').strip()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {stderr[-500:]}")
+        os.replace(part, target)
+        return downloaded
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        if os.path.exists(part):
+            os.remove(part)
+        raise
@@ -0,0 +1,138 @@
+import time
+import threading
+
+# Largest single sleep, so a lowered or lifted limit is picked up quickly
+MAX_SLEEP = 0.5
+
+def limit_or_none(rate):
+    """A rate of None, 0 or below means unlimited."""
+    return rate if rate is not None and rate > 0 else None
+
+class TokenBucket:
+    """Token bucket refilled at `rate` bytes/s, holding at most one second of tokens.
+
+    Consumers take what they downloaded and sleep while the bucket is in
+    debt, so bursts are smoothed out without dropping any data.
+    """
+
+    def __init__(self, rate=None):
+        self.rate = limit_or_none(rate)
+        self.tokens = self.rate or 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            rate = self.rate = limit_or_none(rate)
+            if rate is not None:
+                self.tokens = min(self.tokens, rate)
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, nbytes):
+        """Takes nbytes out of the bucket and returns how long the caller should wait."""
+        with self.lock:
+            if self.rate is None:
+                return 0
+            self._refill(time.monotonic())
+            self.tokens -= nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+class JobShare:
+    __slots__ = ("limit", "weight", "rate", "bucket")
+
+    def __init__(self, limit, weight):
+        self.limit = limit
+        self.weight = weight
+        self.rate = None
+        self.bucket = TokenBucket()
+
+class BandwidthManager:
+    """Shares a global download cap between running jobs by priority weight.
+
+    Each job has its own token bucket. Its rate is the job's weighted share
+    of the global cap, never more than its own cap; whatever a capped job
+    leaves unused is handed to the others. Limits are in bytes/s and None
+    means unlimited. Changing any limit rebalances the buckets of running
+    jobs immediately.
+    """
+
+    def __init__(self, global_limit=None):
+        self.global_limit = limit_or_none(global_limit)
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def register(self, job_id, limit=None, weight=1.0):
+        with self.lock:
+            self.jobs[job_id] = JobShare(limit_or_none(limit), max(0.01, weight))
+            self._rebalance()
+
+    def unregister(self, job_id):
+        with self.lock:
+            if self.jobs.pop(job_id, None) is not None:
+                self._rebalance()
+
+    def set_global_limit(self, limit):
+        with self.lock:
+            self.global_limit = limit_or_none(limit)
+            self._rebalance()
+
+    def set_job_limit(self, job_id, limit=None, weight=None):
+        with self.lock:
+            share = self.jobs.get(job_id)
+            if share is None:
+                return False
+            share.limit = limit_or_none(limit)
+            if weight is not None:
+                share.weight = max(0.01, weight)
+            self._rebalance()
+            return True
+
+    def _rebalance(self):
+        """Water-filling of the global cap over the job weights. Caller holds the lock."""
+        if self.global_limit is None:
+            for share in self.jobs.values():
+                share.rate = share.limit
+                share.bucket.set_rate(share.rate)
+            return
+
+        remaining = self.global_limit
+        pending = dict(self.jobs)
+        while pending:
+            total_weight = sum(share.weight for share in pending.values())
+            capped = {job_id: share for job_id, share in pending.items()
+                      if share.limit is not None and share.limit <= remaining * share.weight / total_weight}
+            if not capped:
+                for share in pending.values():
+                    share.rate = remaining * share.weight / total_weight
+                break
+            for job_id, share in capped.items():
+                share.rate = share.limit
+                remaining -= share.limit
+                del pending[job_id]
+
+        for share in self.jobs.values():
+            share.bucket.set_rate(share.rate)
+
+    def throttle(self, job_id, nbytes):
+        """Accounts nbytes to a job and blocks the calling download thread while it is over its rate."""
+        share = self.jobs.get(job_id)
+        if share is None or nbytes <= 0:
+            return
+        wait = share.bucket.consume(nbytes)
+        while wait > 0:
+            time.sleep(min(wait, MAX_SLEEP))
+            # Re-check after each slice: the limit may have been raised meanwhile
+            wait = share.bucket.consume(0)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "global_limit": self.global_limit,
+                "jobs": {job_id: {"limit": share.limit, "weight": share.weight, "rate": share.rate}
+                         for job_id, share in self.jobs.items()},
+            }
@@ -0,0 +1,367 @@
+"""Offline end-to-end download benchmark.
+
+A local stand-in server serves synthetic media and a headless app server
+downloads it through the real /api/download path:
+  progressive   one MP4 file over plain HTTP, with range requests
+  hls           an HLS media playlist of MPEG-TS segments
+  dash          a DASH manifest with one muxed representation
+  playlist      an RSS feed of progressive MP4 items
+
+The stand-in server can delay every request, cap the bandwidth of each
+connection and answer a share of media requests with 503. Failures come
+from a seeded RNG, so a run can be repeated exactly. The app runs with a
+temporary home directory, so its config, caches and history start empty
+and the user's own are left alone. Nothing leaves 127.0.0.1.
+
+Every scenario reports request latency and time-to-first-byte percentiles,
+throughput, plus the CPU time and peak RSS of the app server process
+(psutil when installed, /proc otherwise).
+
+    python benchmarks/download_bench.py --runs 5
+    python benchmarks/download_bench.py --scenario hls --latency 0.05 --bandwidth 2000000 --error-rate 0.05
+    python benchmarks/download_bench.py --config fragment_concurrency=4 --config postprocess_workers=1
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("progressive", "hls", "dash", "playlist")
+MB = 1024 * 1024
+SEGMENT_SECONDS = 2
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def synthetic_bytes(size, seed):
+    """Incompressible, reproducible payload: one random block repeated up to size."""
+    block = random.Random(seed).randbytes(min(size, MB))
+    return (block * (size // len(block) + 1))[:size]
+
+def build_site(size, segments, items):
+    """Maps every path of the stand-in server to (content type, body, is_media)."""
+    site = {"/progressive.mp4": ("video/mp4", synthetic_bytes(size, 1), True)}
+
+    segment = synthetic_bytes(size // segments, 2)
+    playlist = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(segments):
+        playlist += [f"#EXTINF:{SEGMENT_SECONDS}.0,", f"seg{i}.ts"]
+        site[f"/hls/seg{i}.ts"] = ("video/mp2t", segment, True)
+    playlist.append("#EXT-X-ENDLIST")
+    site["/hls/index.m3u8"] = ("application/vnd.apple.mpegurl", "\n".join(playlist).encode(), False)
+
+    duration = segments * SEGMENT_SECONDS
+    bandwidth = len(segment) * 8 // SEGMENT_SECONDS
+    site["/dash/manifest.mpd"] = ("application/dash+xml", f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S"
+     mediaPresentationDuration="PT{duration}S" profiles="urn:mpeg:dash:profile:isoff-live:2011">
+  <Period id="0" start="PT0S">
+    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="muxed" codecs="avc1.4d401f,mp4a.40.2" width="1280" height="720" bandwidth="{bandwidth}">
+        <SegmentTemplate timescale="1" duration="{SEGMENT_SECONDS}" startNumber="1"
+                         initialization="init.mp4" media="seg$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>""".encode(), False)
+    site["/dash/init.mp4"] = ("video/mp4", synthetic_bytes(1024, 3), True)
+    for i in range(1, segments + 1):
+        site[f"/dash/seg{i}.m4s"] = ("video/iso.segment", segment, True)
+
+    item = synthetic_bytes(size // items, 4)
+    entries = []
+    for i in range(items):
+        site[f"/items/item{i}.mp4"] = ("video/mp4", item, True)
+        entries.append(f'<item><title>Item {i}</title><link>{{base}}/items/item{i}.mp4</link>'
+                       f'<enclosure url="{{base}}/items/item{i}.mp4" type="video/mp4"/></item>')
+    site["/playlist.rss"] = ("application/rss+xml", (
+        '<?xml version="1.0"?><rss version="2.0"><channel><title>Benchmark playlist</title>'
+        '<link>{base}/</link>' + "".join(entries) + '</channel></rss>').encode(), False)
+    return site
+
+def payload_bytes(site, scenario):
+    prefix = {"progressive": "/progressive", "hls": "/hls/", "dash": "/dash/", "playlist": "/items/"}[scenario]
+    return sum(len(body) for path, (_, body, media) in site.items() if media and path.startswith(prefix))
+
+class StandInServer:
+    """Serves the synthetic site with injected latency, per-connection bandwidth and 503 errors."""
+
+    def __init__(self, site, latency=0.0, bandwidth=None, error_rate=0.0, seed=0):
+        self.port = free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        self.site = {path: (ctype, body if media else body.replace(b"{base}", self.base.encode()), media)
+                     for path, (ctype, body, media) in site.items()}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.injected_errors = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler())
+        self.httpd.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="stand-in-server", daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def should_fail(self, media):
+        with self.lock:
+            self.requests += 1
+            # Manifests never fail, an unreadable playlist would only measure the extractor giving up
+            if media and self.error_rate and self.rng.random() < self.error_rate:
+                self.injected_errors += 1
+                return True
+            return False
+
+    def send(self, wfile, body):
+        chunk = 64 * 1024
+        start = time.monotonic()
+        for offset in range(0, len(body), chunk):
+            wfile.write(body[offset:offset + chunk])
+            if self.bandwidth:
+                ahead = (offset + chunk) / self.bandwidth - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                self.respond(send_body=False)
+
+            def do_GET(self):
+                self.respond(send_body=True)
+
+            def respond(self, send_body):
+                if server.latency:
+                    time.sleep(server.latency)
+                entry = server.site.get(self.path.split("?", 1)[0])
+                if entry is None:
+                    self.send_error(404)
+                    return
+                ctype, body, media = entry
+                if server.should_fail(media):
+                    self.send_error(503)
+                    return
+                start, end = 0, len(body) - 1
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match and media:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)) if match.group(2) else end, end)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if send_body:
+                    try:
+                        server.send(self.wfile, body[start:end + 1])
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+def process_usage(pid):
+    """(CPU seconds, RSS bytes) of a process, or (None, None) without psutil or /proc."""
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        cpu = process.cpu_times()
+        return cpu.user + cpu.system, process.memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), rss
+    except (OSError, ValueError, StopIteration):
+        return None, None
+
+class UsageSampler:
+    """Samples the peak RSS of a process in the background while a scenario runs."""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            _, rss = process_usage(self.pid)
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.cpu_start, _ = process_usage(self.pid)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        cpu_end, _ = process_usage(self.pid)
+        self.cpu_seconds = round(cpu_end - self.cpu_start, 3) if cpu_end is not None and self.cpu_start is not None else None
+
+def api(base, method, path, body=None, timeout=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(f"{base}{path}", data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+def parse_config(pairs):
+    config = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+def start_app(home, config, timeout=60):
+    """Starts a headless app server whose home (and so config, caches, history) is a scratch directory."""
+    app_dir = os.path.join(home, ".config", "VideoIndiren")
+    os.makedirs(app_dir, exist_ok=True)
+    # Without ~/Downloads the app falls back to ./downloads, inside the repository
+    os.makedirs(os.path.join(home, "Downloads"), exist_ok=True)
+    with open(os.path.join(app_dir, "config.json"), "w") as f:
+        json.dump(config, f)
+    env = dict(os.environ, HOME=home, USERPROFILE=home, APPDATA=home)
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "main.py", "--headless", "--port", str(port)], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            api(base, "GET", "/api/heartbeat", timeout=1)
+            return proc, base
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise TimeoutError(f"App server did not answer within {timeout}s")
+
+def stop_app(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 3)
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99),
+            "min": round(ordered[0], 3), "max": round(ordered[-1], 3), "runs": len(ordered)}
+
+def scenario_request(stand_in, scenario, download_dir):
+    url = {"progressive": "/progressive.mp4", "hls": "/hls/index.m3u8",
+           "dash": "/dash/manifest.mpd", "playlist": "/playlist.rss"}[scenario]
+    return {"url": stand_in.base + url, "download_dir": download_dir, "force": True, "refresh_metadata": True,
+            "download_playlist": scenario == "playlist"}
+
+def run_scenario(app_base, app_pid, stand_in, scenario, runs, app_download_dir, payload):
+    latencies, ttfbs, throughputs, errors = [], [], [], []
+    requests_before, injected_before = stand_in.requests, stand_in.injected_errors
+    with UsageSampler(app_pid) as usage:
+        for run in range(runs):
+            # Relative to the app's download folder, a headless server refuses folders outside of it
+            download_dir = f"bench/{scenario}-{run}"
+            os.makedirs(os.path.join(app_download_dir, download_dir))
+            start = time.perf_counter()
+            try:
+                api(app_base, "POST", "/api/download", scenario_request(stand_in, scenario, download_dir))
+            except urllib.error.HTTPError as e:
+                errors.append(json.loads(e.read().decode("utf-8")).get("detail"))
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                shutil.rmtree(os.path.join(app_download_dir, download_dir), ignore_errors=True)
+            latencies.append(elapsed)
+            throughputs.append(payload / elapsed)
+            job = max(api(app_base, "GET", "/api/jobs")["jobs"], key=lambda j: j["created_at"])
+            if job["stats"].get("time_to_first_byte_seconds") is not None:
+                ttfbs.append(job["stats"]["time_to_first_byte_seconds"])
+    throughput = percentiles(throughputs)
+    return {
+        "payload_bytes": payload,
+        "failed": len(errors),
+        "errors": errors[:3],
+        "latency_seconds": percentiles(latencies),
+        "ttfb_seconds": percentiles(ttfbs),
+        "throughput_bytes_per_second": {k: int(v) if k != "runs" else v for k, v in throughput.items()} if throughput else None,
+        "server_requests": stand_in.requests - requests_before,
+        "injected_errors": stand_in.injected_errors - injected_before,
+        "cpu_seconds": usage.cpu_seconds,
+        "peak_rss_bytes": usage.peak_rss,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Repeatable, default: all")
+    parser.add_argument("--runs", type=int, default=3, help="Downloads per scenario")
+    parser.add_argument("--size-mb", type=float, default=32, help="Payload per download")
+    parser.add_argument("--segments", type=int, default=40, help="HLS/DASH segments per stream")
+    parser.add_argument("--items", type=int, default=4, help="Playlist entries")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--bandwidth", type=int, default=None, help="Bytes/s per connection")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of media requests answered with 503")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the error injection")
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=VALUE",
+                        help="App config.json setting, e.g. fragment_concurrency=4; repeatable")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or list(SCENARIOS)
+    site = build_site(int(args.size_mb * MB), args.segments, args.items)
+    stand_in = StandInServer(site, args.latency, args.bandwidth, args.error_rate, args.seed)
+    stand_in.start()
+    home = tempfile.mkdtemp(prefix="videoindiren-bench-")
+    proc = None
+    try:
+        proc, app_base = start_app(home, parse_config(args.config))
+        results = {scenario: run_scenario(app_base, proc.pid, stand_in, scenario, args.runs,
+                                          os.path.join(home, "Downloads"), payload_bytes(site, scenario))
+                   for scenario in scenarios}
+    finally:
+        if proc is not None:
+            stop_app(proc)
+        stand_in.stop()
+        shutil.rmtree(home, ignore_errors=True)
+
+    settings = {k: v for k, v in vars(args).items() if k != "scenario"}
+    print(json.dumps({"settings": settings, "scenarios": results}, indent=2))
@@ -0,0 +1,195 @@
+"""Command line client for a Video İndiren server, e.g. one started with `main.py --headless`.
+
+    python cli.py add https://youtube.com/watch?v=... --audio --wait
+    python cli.py batch links.txt --wait
+    python cli.py jobs
+    python cli.py cancel <job id>
+    python cli.py pause <job id>
+    python cli.py bandwidth 2000000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import urllib.error
+import urllib.request
+
+DEFAULT_SERVER = os.environ.get("VIDEO_INDIREN_SERVER", "http://127.0.0.1:4321")
+FINAL_STATES = ("finished", "error", "cancelled", "interrupted")
+
+def api(server, method, path, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(f"{server.rstrip('/')}{path}", data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        try:
+            detail = json.loads(e.read().decode('utf-8')).get("detail")
+        except Exception:
+            detail = e.reason
+        sys.exit(f"Server error {e.code}: {detail}")
+    except urllib.error.URLError as e:
+        sys.exit(f"Cannot reach {server}: {e.reason}")
+
+def job_options(args):
+    options = {
+        "quality": args.quality,
+        "audio_only": args.audio,
+        "download_playlist": args.playlist,
+        "force": args.force,
+    }
+    if args.priority:
+        options["priority"] = args.priority
+    if args.dir:
+        # A path on the server, resolved there: relative ones land under its download folder
+        options["download_dir"] = args.dir
+    return options
+
+def print_job(job):
+    progress = job.get("progress") or {}
+    line = f"{job['job_id']}  {job['status']:<14} {progress.get('percent', ''):>7}  {job['url']}"
+    if job.get("error"):
+        line += f"  ({job['error']})"
+    elif job.get("result") and job["result"].get("full_path"):
+        line += f"  -> {job['result']['full_path']}"
+    print(line)
+
+def wait_for_job(server, job_id):
+    last = None
+    while True:
+        job = api(server, "GET", f"/api/jobs/{job_id}")
+        progress = job.get("progress") or {}
+        state = (job["status"], progress.get("percent"), progress.get("speed"))
+        if state != last:
+            print(f"\r{job['status']:<14} {progress.get('percent', ''):>7}  {progress.get('speed', '')}".ljust(60),
+                  end="", flush=True)
+            last = state
+        if job["status"] in FINAL_STATES:
+            print()
+            print_job(job)
+            return 0 if job["status"] == "finished" else 1
+        time.sleep(1)
+
+def wait_for_batch(server, batch_id):
+    while True:
+        batch = api(server, "GET", f"/api/batches/{batch_id}")
+        counts = ", ".join(f"{status}: {n}" for status, n in sorted(batch["counts"].items()))
+        print(f"\r{batch['percent']:>7}  {counts}".ljust(80), end="", flush=True)
+        if batch["finished"]:
+            print()
+            for item in batch["items"]:
+                detail = item.get("error") or ((item.get("result") or {}).get("full_path")) or ""
+                print(f"{item['status']:<12} {item['url']}  {detail}")
+            return 0 if all(item["status"] == "finished" for item in batch["items"]) else 1
+        time.sleep(1)
+
+def cmd_add(args):
+    options = job_options(args)
+    if len(args.urls) > 1:
+        result = api(args.server, "POST", "/api/jobs/batch", {"urls": args.urls, **options})
+        print(f"Batch {result['batch_id']}: {result['accepted']} URLs queued, {result['duplicates']} duplicates dropped")
+        return wait_for_batch(args.server, result["batch_id"]) if args.wait else 0
+    if args.format:
+        options["format_id"] = args.format
+    result = api(args.server, "POST", "/api/jobs", {"url": args.urls[0], **options})
+    print(f"Job {result['job_id']} {result['status']}")
+    return wait_for_job(args.server, result["job_id"]) if args.wait else 0
+
+def cmd_batch(args):
+    with open(args.file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    result = api(args.server, "POST", "/api/jobs/batch", {"text": text, **job_options(args)})
+    print(f"Batch {result['batch_id']}: {result['accepted']} URLs queued, {result['duplicates']} duplicates dropped")
+    return wait_for_batch(args.server, result["batch_id"]) if args.wait else 0
+
+def cmd_jobs(args):
+    for job in api(args.server, "GET", "/api/jobs")["jobs"]:
+        print_job(job)
+    return 0
+
+def cmd_status(args):
+    if args.wait:
+        return wait_for_job(args.server, args.job_id)
+    print_job(api(args.server, "GET", f"/api/jobs/{args.job_id}"))
+    return 0
+
+def cmd_cancel(args):
+    api(args.server, "POST", f"/api/jobs/{args.job_id}/cancel")
+    print(f"Cancel requested for {args.job_id}")
+    return 0
+
+def cmd_pause(args):
+    result = api(args.server, "POST", f"/api/jobs/{args.job_id}/pause")
+    print(f"Pause requested for {args.job_id} ({result['status']})")
+    return 0
+
+def cmd_resume(args):
+    result = api(args.server, "POST", f"/api/jobs/{args.job_id}/resume")
+    print(f"Job {args.job_id} {result['status']}")
+    return 0
+
+def cmd_bandwidth(args):
+    if args.limit is None:
+        result = api(args.server, "GET", "/api/bandwidth")
+    else:
+        result = api(args.server, "POST", "/api/bandwidth", {"limit": args.limit})
+    print(json.dumps(result, indent=2))
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Video İndiren command line client")
+    parser.add_argument("--server", default=DEFAULT_SERVER,
+                        help=f"Server URL (default: {DEFAULT_SERVER}, or VIDEO_INDIREN_SERVER)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_job_options(sub):
+        sub.add_argument("--audio", action="store_true", help="Audio only (mp3)")
+        sub.add_argument("--playlist", action="store_true", help="Download the whole playlist")
+        sub.add_argument("--quality", default="best", choices=["best", "4k", "1080p", "720p", "480p"])
+        sub.add_argument("--dir", help="Download directory on the server, relative to its download folder")
+        sub.add_argument("--force", action="store_true", help="Download again even if the history has it")
+        sub.add_argument("--priority", choices=["interactive", "bulk"],
+                         help="Scheduling class (default: bulk for playlists and batches, else interactive)")
+        sub.add_argument("--wait", action="store_true", help="Follow progress until the download ends")
+
+    add = commands.add_parser("add", help="Queue one or more URLs")
+    add.add_argument("urls", nargs="+")
+    add.add_argument("--format", help="Exact yt-dlp format, e.g. 137+140")
+    add_job_options(add)
+    add.set_defaults(func=cmd_add)
+
+    batch = commands.add_parser("batch", help="Queue every URL found in a text or CSV file")
+    batch.add_argument("file")
+    add_job_options(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    commands.add_parser("jobs", help="List jobs").set_defaults(func=cmd_jobs)
+
+    status = commands.add_parser("status", help="Show one job")
+    status.add_argument("job_id")
+    status.add_argument("--wait", action="store_true", help="Follow progress until the download ends")
+    status.set_defaults(func=cmd_status)
+
+    cancel = commands.add_parser("cancel", help="Cancel a job")
+    cancel.add_argument("job_id")
+    cancel.set_defaults(func=cmd_cancel)
+
+    pause = commands.add_parser("pause", help="Pause a job, keeping its partial files")
+    pause.add_argument("job_id")
+    pause.set_defaults(func=cmd_pause)
+
+    resume = commands.add_parser("resume", help="Resume a paused job")
+    resume.add_argument("job_id")
+    resume.set_defaults(func=cmd_resume)
+
+    bandwidth = commands.add_parser("bandwidth", help="Show or set the global bandwidth limit")
+    bandwidth.add_argument("limit", type=int, nargs="?", help="Bytes per second, 0 for unlimited")
+    bandwidth.set_defaults(func=cmd_bandwidth)
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,144 @@
+import os
+import shutil
+import logging
+import threading
+from progress_store import format_bytes
+
+logger = logging.getLogger(__name__)
+
+class DiskSpaceError(Exception):
+    pass
+
+def estimate_download_size(info):
+    """Bytes the selected format(s) of an info dict will take, or None when yt-dlp gives no hint.
+
+    Uses the exact filesize, then filesize_approx, then bitrate x duration.
+    """
+    total = 0
+    for fmt in info.get('requested_formats') or [info]:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and info.get('duration'):
+            size = fmt['tbr'] * 125 * info['duration'] # kbit/s -> bytes
+        if not size:
+            return None
+        total += int(size)
+    return total
+
+def existing_parent(path):
+    """path itself or its nearest existing parent, e.g. for a playlist folder not created yet."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+def volume_of(path):
+    return os.stat(existing_parent(path)).st_dev
+
+def free_space(path):
+    return shutil.disk_usage(existing_parent(path)).free
+
+class Reservation:
+    __slots__ = ("job_id", "volume", "nbytes", "prefix", "files")
+
+    def __init__(self, job_id, volume, nbytes, prefix):
+        self.job_id = job_id
+        self.volume = volume
+        self.nbytes = nbytes
+        self.prefix = prefix # Every file of the download starts with it (.part, .fNNN, .temp)
+        self.files = {} # filename -> bytes already on disk
+
+    @property
+    def outstanding(self):
+        """Reserved bytes not written yet; the written ones already show up in the volume's used space."""
+        return max(0, self.nbytes - sum(self.files.values()))
+
+class DiskSpaceManager:
+    """Admission control on the free space of the download volumes.
+
+    Each download reserves its estimated peak size before it starts. A
+    reservation fits when the volume's free space, minus min_free and minus
+    what other reservations still have to write, covers it. One that does
+    not fit waits while other reservations on the volume are active (a
+    failing job or a finished merge gives space back) and is rejected
+    outright when nothing could free enough.
+    """
+
+    def __init__(self, min_free=0, poll_interval=5.0):
+        self.min_free = min_free
+        self.poll_interval = poll_interval
+        self.reservations = []
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def available(self, directory):
+        """Bytes a new reservation on directory's volume could take right now. Caller holds the lock."""
+        volume = volume_of(directory)
+        outstanding = sum(r.outstanding for r in self.reservations if r.volume == volume)
+        return free_space(directory) - self.min_free - outstanding
+
+    def check_free(self, directory):
+        """Fails fast when the volume is already below min_free."""
+        if not self.min_free:
+            return
+        free = free_space(directory)
+        if free < self.min_free:
+            raise DiskSpaceError(f"Only {format_bytes(free)} free in {directory}, "
+                                 f"below the {format_bytes(self.min_free)} minimum")
+
+    def reserve(self, job_id, directory, nbytes, prefix, should_stop=None, on_wait=None):
+        """Reserves nbytes on directory's volume, waiting for space while other downloads may free some.
+
+        Raises DiskSpaceError when it cannot fit; should_stop() is polled
+        while waiting and ends the wait by returning True.
+        """
+        volume = volume_of(directory)
+        waited = False
+        with self.changed:
+            while True:
+                available = self.available(directory)
+                if nbytes <= available:
+                    reservation = Reservation(job_id, volume, nbytes, prefix)
+                    self.reservations.append(reservation)
+                    return reservation
+                others = [r for r in self.reservations if r.volume == volume]
+                if not others:
+                    raise DiskSpaceError(f"Not enough disk space in {directory}: {format_bytes(nbytes)} needed, "
+                                         f"{format_bytes(max(0, available))} available")
+                if should_stop and should_stop():
+                    return None
+                if not waited:
+                    waited = True
+                    logger.info("Job %s waits for %s of disk space in %s (%s downloads hold reservations there)",
+                                job_id, format_bytes(nbytes), directory, len(others))
+                    if on_wait:
+                        on_wait()
+                self.changed.wait(self.poll_interval)
+
+    def record_written(self, reservation, filename, nbytes):
+        if reservation is not None:
+            reservation.files[filename] = nbytes
+
+    def find(self, job_id, filename):
+        """The reservation a file of the job belongs to, or None."""
+        for reservation in list(self.reservations):
+            if reservation.job_id == job_id and filename.startswith(reservation.prefix):
+                return reservation
+        return None
+
+    def release(self, reservation):
+        if reservation is None:
+            return
+        with self.changed:
+            if reservation in self.reservations:
+                self.reservations.remove(reservation)
+            self.changed.notify_all()
+
+    def stats(self):
+        with self.lock:
+            reservations = list(self.reservations)
+        return {
+            "min_free": self.min_free,
+            "reservations": len(reservations),
+            "reserved_bytes": sum(r.nbytes for r in reservations),
+            "outstanding_bytes": sum(r.outstanding for r in reservations),
+        }
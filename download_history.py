@@ -0,0 +1,107 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+from metadata_cache import normalize_url
+
+# Bytes hashed at each end of a file for its fingerprint
+FINGERPRINT_CHUNK = 1024 * 1024
+
+COLUMNS = ("id", "video_key", "url", "kind", "extractor", "video_id", "title",
+           "format_id", "path", "size", "hash", "downloaded_at")
+SELECT_COLUMNS = ", ".join(COLUMNS)
+
+def file_fingerprint(path):
+    """Quick SHA-256 fingerprint over the size and the first/last MiB of a file.
+
+    Hashing multi-gigabyte videos in full would take longer than some of the
+    downloads; the size plus both ends is enough to tell files apart.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if size > 2 * FINGERPRINT_CHUNK:
+            f.seek(-FINGERPRINT_CHUNK, os.SEEK_END)
+            digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+class DownloadHistory:
+    """Persistent index of finished downloads used for duplicate detection before any network call.
+
+    A video counts as downloaded once per kind ("video" or "audio"),
+    regardless of quality. Records carry an "exists" flag telling whether
+    the file is still where it was saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " video_key TEXT, url TEXT NOT NULL, kind TEXT NOT NULL,"
+                " extractor TEXT, video_id TEXT, title TEXT, format_id TEXT,"
+                " path TEXT, size INTEGER, hash TEXT, downloaded_at REAL NOT NULL)")
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_downloads_key ON downloads(video_key, kind)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_url ON downloads(url, kind)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_time ON downloads(downloaded_at)")
+
+    @staticmethod
+    def _row_to_dict(row):
+        item = dict(zip(COLUMNS, row))
+        item["exists"] = bool(item["path"]) and os.path.exists(item["path"])
+        return item
+
+    def find(self, kind, video_key=None, url=None):
+        """Returns the history record for a video key or URL, or None."""
+        with self.lock:
+            row = None
+            if video_key:
+                row = self.conn.execute(f"SELECT {SELECT_COLUMNS} FROM downloads WHERE video_key = ? AND kind = ?",
+                                        (video_key, kind)).fetchone()
+            if row is None and url:
+                row = self.conn.execute(f"SELECT {SELECT_COLUMNS} FROM downloads WHERE url = ? AND kind = ?",
+                                        (normalize_url(url), kind)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def record(self, kind, url, info, path):
+        size, fingerprint = None, None
+        if path and os.path.exists(path):
+            size = os.path.getsize(path)
+            fingerprint = file_fingerprint(path)
+        extractor = info.get('extractor_key') or info.get('ie_key')
+        # Generic ids are just file names, only the URL identifies those videos
+        video_key = f"{extractor}:{info['id']}" if extractor not in (None, 'Generic') and info.get('id') else None
+        with self.lock, self.conn:
+            if video_key is None:
+                self.conn.execute("DELETE FROM downloads WHERE video_key IS NULL AND url = ? AND kind = ?",
+                                  (normalize_url(url), kind))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO downloads (video_key, url, kind, extractor, video_id, title, format_id,"
+                " path, size, hash, downloaded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video_key, normalize_url(url), kind, extractor, info.get('id'), info.get('title'),
+                 info.get('format_id'), path, size, fingerprint, time.time()))
+
+    def page(self, page=1, page_size=50, query=None):
+        page = max(1, page)
+        page_size = max(1, min(500, page_size))
+        where, params = "", []
+        if query:
+            where = "WHERE title LIKE ? OR url LIKE ? OR video_id = ?"
+            params = [f"%{query}%", f"%{query}%", query]
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM downloads {where}", params).fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT {SELECT_COLUMNS} FROM downloads {where} ORDER BY downloaded_at DESC LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size]).fetchall()
+        return {"items": [self._row_to_dict(row) for row in rows], "total": total,
+                "page": page, "page_size": page_size}
+
+    def delete(self, record_id):
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM downloads WHERE id = ?", (record_id,)).rowcount > 0
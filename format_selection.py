@@ -0,0 +1,231 @@
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Maximum video height for each quality preset of the UI, None means no limit
+QUALITY_HEIGHTS = {
+    "4k": 2160,
+    "1080p": 1080,
+    "720p": 720,
+    "480p": 480,
+    "best": None,
+}
+
+# Codec families each container takes with a plain stream copy (-c copy)
+REMUX_CODECS = {
+    "mp4": {"avc1", "avc3", "h264", "hev1", "hvc1", "hevc", "h265", "av01", "av1", "mp4a", "aac", "ac-3", "ec-3"},
+    "webm": {"vp8", "vp9", "vp09", "av01", "av1", "opus", "vorbis"},
+}
+REMUX_CODECS["mkv"] = REMUX_CODECS["mp4"] | REMUX_CODECS["webm"] | {"mp3", "flac", "dts", "alac", "pcm"}
+
+# Output containers in order of preference, mp4 plays everywhere
+CONTAINERS = ("mp4", "webm", "mkv")
+CONTAINER_RANK = {container: len(CONTAINERS) - i for i, container in enumerate(CONTAINERS)}
+
+def quality_selector(quality):
+    """yt-dlp format selector for a quality preset, a function yt-dlp calls with the available formats.
+
+    It picks the best single file or video+audio pair under the preset's
+    height, preferring pairs that merge by stream copy, and sets the
+    output container to one that fits the codecs.
+    """
+    height = QUALITY_HEIGHTS.get(quality)
+
+    def select(ctx):
+        formats = [f for f in ctx['formats'] if format_kind(f) != "other" and f.get('protocol') != 'mhtml']
+        candidates = rank_candidates(formats, height)
+        if not candidates:
+            return
+        video, audio, container, remux = candidates[0]
+        if audio is None:
+            yield video
+            return
+        pair = f"{video['format_id']}+{audio['format_id']}"
+        if remux:
+            logger.info("Selected %s: %s + %s remuxed into %s",
+                        pair, video.get('vcodec'), audio.get('acodec'), container)
+        else:
+            logger.warning("Selected %s: no stream-copy pair available, merging %s + %s into %s may need a transcode",
+                           pair, video.get('vcodec'), audio.get('acodec'), container)
+        yield merged_format(video, audio, container)
+
+    return select
+
+# yt-dlp uses 'none' for an absent stream and leaves unknown codecs unset
+def has_video(fmt):
+    return fmt.get('vcodec') != 'none'
+
+def has_audio(fmt):
+    return fmt.get('acodec') != 'none'
+
+def format_kind(fmt):
+    if has_video(fmt) and has_audio(fmt):
+        return "video+audio"
+    if has_video(fmt):
+        return "video"
+    if has_audio(fmt):
+        return "audio"
+    return "other"
+
+def estimate_filesize(fmt, duration):
+    """Exact size when the site reports one, otherwise bitrate (kbit/s) times duration."""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    if fmt.get('tbr') and duration:
+        return int(fmt['tbr'] * 1000 / 8 * duration)
+    return None
+
+def codec_family(codec):
+    """'avc1.640028' -> 'avc1'; None when the codec is absent or unknown."""
+    if not codec or codec == 'none':
+        return None
+    return codec.split('.')[0].lower()
+
+def merge_container(video_fmt, audio_fmt):
+    """Container for merging a video and an audio format, and whether a stream copy is known to work.
+
+    With known codecs the first container that takes both wins. Without
+    codec info the file extensions decide, as in yt-dlp.
+    """
+    codecs = {codec_family(video_fmt.get('vcodec')), codec_family(audio_fmt.get('acodec'))}
+    if None not in codecs:
+        for container in CONTAINERS:
+            if codecs <= REMUX_CODECS[container]:
+                return container, True
+        return "mkv", False
+    exts = {video_fmt.get('ext'), audio_fmt.get('ext')}
+    if exts <= {"mp4", "m4a"}:
+        return "mp4", True
+    if exts == {"webm"}:
+        return "webm", True
+    return "mkv", False
+
+def best_audio_for(video_fmt, audio_formats):
+    """Audio-only format to pair with a video, preferring a stream-copy merge into the best container, then bitrate."""
+    if not audio_formats:
+        return None
+
+    def score(audio):
+        container, remux = merge_container(video_fmt, audio)
+        return (remux, CONTAINER_RANK.get(container, 0), audio.get('abr') or audio.get('tbr') or 0)
+
+    return max(audio_formats, key=score)
+
+def rank_candidates(formats, max_height=None):
+    """Single files and video+audio pairs as (video, audio, container, remux), best first.
+
+    Candidates that merge by stream copy always come first, then height,
+    high frame rate, container and the higher bitrate; the smaller file
+    only decides between equal bitrates. yt-dlp's own order of `formats`
+    (worst to best) breaks the remaining ties.
+    """
+    position = {id(f): i for i, f in enumerate(formats)}
+    videos = [f for f in formats if has_video(f)]
+    if max_height is not None:
+        # Like "/best" in a selector string: nothing under the cap means take what there is
+        videos = [f for f in videos if (f.get('height') or 0) <= max_height] or videos
+    audio_formats = [f for f in formats if format_kind(f) == "audio"]
+
+    candidates = []
+    for video in videos:
+        if has_audio(video):
+            candidates.append((video, None, video.get('ext'), True))
+            continue
+        audio = best_audio_for(video, audio_formats)
+        if audio is not None:
+            candidates.append((video, audio, *merge_container(video, audio)))
+    if not candidates:
+        # Audio-only sites, or video without any audio to add
+        candidates = [(f, None, f.get('ext'), True) for f in audio_formats or videos]
+
+    def score(candidate):
+        video, audio, container, remux = candidate
+        bitrate = video.get('tbr') or video.get('vbr') or 0
+        if audio is not None:
+            bitrate += audio.get('abr') or audio.get('tbr') or 0
+        size = sum(estimate_filesize(f, None) or math.inf for f in (video, audio) if f is not None)
+        return (remux, video.get('height') or 0, (video.get('fps') or 0) > 30,
+                CONTAINER_RANK.get(container, 0), bitrate, -size, position[id(video)])
+
+    return sorted(candidates, key=score, reverse=True)
+
+def merged_format(video_fmt, audio_fmt, container):
+    """Format dict for a video+audio pair, in the shape yt-dlp's own "+" selector produces."""
+    from yt_dlp.utils import determine_protocol
+    pair = (video_fmt, audio_fmt)
+    return {
+        'requested_formats': list(pair),
+        'format': '+'.join(f.get('format') or f['format_id'] for f in pair),
+        'format_id': '+'.join(f['format_id'] for f in pair),
+        'ext': container,
+        'protocol': '+'.join(map(determine_protocol, pair)),
+        'filesize_approx': sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in pair) or None,
+        'tbr': sum(f.get('tbr') or f.get('vbr') or f.get('abr') or 0 for f in pair),
+        'width': video_fmt.get('width'),
+        'height': video_fmt.get('height'),
+        'resolution': video_fmt.get('resolution'),
+        'fps': video_fmt.get('fps'),
+        'dynamic_range': video_fmt.get('dynamic_range'),
+        'vcodec': video_fmt.get('vcodec'),
+        'vbr': video_fmt.get('vbr'),
+        'aspect_ratio': video_fmt.get('aspect_ratio'),
+        'acodec': audio_fmt.get('acodec'),
+        'abr': audio_fmt.get('abr'),
+        'asr': audio_fmt.get('asr'),
+        'audio_channels': audio_fmt.get('audio_channels'),
+    }
+
+def build_format_ladder(info):
+    """Turns an extracted info dict into the format list shown by /api/formats.
+
+    Every row carries the exact selector to pin for a download; video-only
+    formats are paired with the best matching audio so the row size is the
+    size of the final file.
+    """
+    duration = info.get('duration')
+    formats = [f for f in info.get('formats') or [] if format_kind(f) != "other"
+               and f.get('protocol') not in ('mhtml',)]
+    audio_formats = [f for f in formats if format_kind(f) == "audio"]
+
+    ladder = []
+    for fmt in formats:
+        kind = format_kind(fmt)
+        filesize = estimate_filesize(fmt, duration)
+        selector = fmt['format_id']
+        container, remux = fmt.get('ext'), True
+        if kind == "video":
+            audio = best_audio_for(fmt, audio_formats)
+            if audio:
+                selector = f"{fmt['format_id']}+{audio['format_id']}"
+                container, remux = merge_container(fmt, audio)
+                audio_size = estimate_filesize(audio, duration)
+                filesize = filesize + audio_size if filesize and audio_size else filesize
+        ladder.append({
+            "format_id": fmt['format_id'],
+            "download_format": selector,
+            "kind": kind,
+            "ext": fmt.get('ext'),
+            "resolution": fmt.get('resolution') or (f"{fmt.get('width')}x{fmt.get('height')}" if fmt.get('height') else None),
+            "height": fmt.get('height'),
+            "fps": fmt.get('fps'),
+            "vcodec": fmt.get('vcodec') if has_video(fmt) else None,
+            "acodec": fmt.get('acodec') if has_audio(fmt) else None,
+            "tbr": fmt.get('tbr'),
+            "abr": fmt.get('abr'),
+            "protocol": fmt.get('protocol'),
+            "filesize": filesize,
+            "filesize_exact": bool(fmt.get('filesize')),
+            "container": container, # Of the downloaded file, after merging
+            "remux": remux, # False when the merge may need a transcode
+        })
+
+    ladder.sort(key=lambda row: (row["height"] or 0, row["tbr"] or 0), reverse=True)
+    return {
+        "id": info.get('id'),
+        "title": info.get('title'),
+        "duration": duration,
+        "extractor": info.get('extractor_key'),
+        "formats": ladder,
+    }
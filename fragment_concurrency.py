@@ -0,0 +1,90 @@
+import time
+import threading
+
+class HostState:
+    __slots__ = ("concurrency", "window_start", "window_bytes", "window_errors",
+                 "last_throughput", "last_change")
+
+    def __init__(self, concurrency, now):
+        self.concurrency = concurrency
+        self.window_start = now
+        self.window_bytes = 0
+        self.window_errors = 0
+        self.last_throughput = 0.0
+        self.last_change = None # "up" or "down", direction of the previous adjustment
+
+class AdaptiveConcurrency:
+    """AIMD controller for yt-dlp's concurrent_fragment_downloads, learned per host.
+
+    Fragment throughput and retry errors are collected in windows of
+    `window` seconds. A window with errors halves the concurrency
+    (multiplicative decrease); a clean window adds one connection (additive
+    increase) unless the previous increase made throughput drop, in which
+    case the controller steps back and holds.
+
+    yt-dlp reads the value when a fragmented download starts, so a change
+    applies from the next format, playlist entry or job on that host.
+    """
+
+    def __init__(self, initial=10, minimum=1, maximum=32, window=4.0):
+        self.initial = max(minimum, min(maximum, initial))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _state(self, host, now):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.initial, now)
+        return state
+
+    def get(self, host):
+        with self.lock:
+            return self._state(host, time.monotonic()).concurrency
+
+    def record_bytes(self, host, nbytes):
+        """Adds downloaded fragment bytes; returns the new concurrency when it changed, else None."""
+        now = time.monotonic()
+        with self.lock:
+            state = self._state(host, now)
+            state.window_bytes += max(0, nbytes)
+            if now - state.window_start < self.window:
+                return None
+            return self._evaluate(state, now)
+
+    def record_error(self, host):
+        """Counts a fragment retry; returns the new concurrency when it changed, else None."""
+        now = time.monotonic()
+        with self.lock:
+            state = self._state(host, now)
+            state.window_errors += 1
+            if now - state.window_start < self.window:
+                return None
+            return self._evaluate(state, now)
+
+    def _evaluate(self, state, now):
+        throughput = state.window_bytes / (now - state.window_start)
+        previous = state.concurrency
+        if state.window_errors:
+            state.concurrency = max(self.minimum, state.concurrency // 2)
+            state.last_change = "down"
+        elif state.last_change == "up" and throughput < state.last_throughput * 0.9:
+            # The extra connection made things slower, give it back and hold
+            state.concurrency = max(self.minimum, state.concurrency - 1)
+            state.last_change = None
+        else:
+            state.concurrency = min(self.maximum, state.concurrency + 1)
+            state.last_change = "up" if state.concurrency != previous else None
+
+        state.last_throughput = throughput
+        state.window_start = now
+        state.window_bytes = 0
+        state.window_errors = 0
+        return state.concurrency if state.concurrency != previous else None
+
+    def snapshot(self):
+        with self.lock:
+            return {host: {"concurrency": s.concurrency, "throughput": s.last_throughput}
+                    for host, s in self.hosts.items()}
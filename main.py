@@ -1,25 +1,42 @@
 import os
 import sys
 import threading
-import uvicorn
 import webbrowser
 import uuid
 import subprocess
 import anyio
-from fastapi import FastAPI, HTTPException
+import asyncio
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-import yt_dlp
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import Literal
 import logging
 import time
 import signal
-import tkinter as tk
-from tkinter import filedialog
-import setup_ffmpeg
+import app_logging
+import metadata_cache
+import format_selection
+import audio_stream
+import range_downloader
+from download_history import DownloadHistory
+import resume_journal
+from fragment_concurrency import AdaptiveConcurrency
+from bandwidth import BandwidthManager
+from postprocess_pipeline import PostProcessingPipeline
+from progress_store import ProgressRecord
+from session_pool import SessionPool
+from disk_space import DiskSpaceManager, estimate_download_size
+from metrics import MetricsRegistry, THROUGHPUT_BUCKETS
+from urllib.parse import urlsplit
 import multiprocessing
 import json
 import re
+import queue
+import collections
+import functools
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # --- AppData Management ---
 def get_app_data_dir():
@@ -37,13 +54,10 @@ APP_DATA_DIR = get_app_data_dir()
 LOG_FILE = os.path.join(APP_DATA_DIR, 'app.log')
 CONFIG_FILE = os.path.join(APP_DATA_DIR, 'config.json')
 FFMPEG_DIR = os.path.join(APP_DATA_DIR, 'ffmpeg')
+METADATA_CACHE_FILE = os.path.join(APP_DATA_DIR, 'metadata_cache.db')
+HISTORY_FILE = os.path.join(APP_DATA_DIR, 'history.db')
+JOURNAL_FILE = os.path.join(APP_DATA_DIR, 'download_journal.json')
 
-# --- Logging Config ---
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 if getattr(sys, 'frozen', False):
@@ -80,31 +94,118 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 # --- 2. Global State ---
 
-def load_config():
+def read_config_file():
     try:
         if os.path.exists(CONFIG_FILE):
             with open(CONFIG_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get("download_dir"), data.get("quality", "best")
+                return json.load(f)
     except Exception as e:
-        logger.error(f"Failed to load config: {e}")
-    return None, "best"
+        logger.error("Failed to load config: %s", e)
+    return {}
+
+def load_config():
+    data = read_config_file()
+    return data.get("download_dir"), data.get("quality", "best")
+
+def get_config_value(key, default=None):
+    return read_config_file().get(key, default)
 
-def save_config(download_dir=None, quality=None):
+# --- Logging Config ---
+# JSON lines written by a background thread, rotated so app.log stays bounded
+log_handler = app_logging.setup_logging(
+    LOG_FILE,
+    level=str(get_config_value("log_level", "INFO")).upper(),
+    max_bytes=int(get_config_value("log_max_mb", 5)) * 1024 * 1024,
+    backups=int(get_config_value("log_backups", 3))
+)
+
+def save_config(download_dir=None, quality=None, **extra):
     try:
-        current_dir, current_quality = load_config()
-        new_dir = download_dir if download_dir is not None else current_dir
-        new_quality = quality if quality is not None else current_quality
+        data = read_config_file()
+        if download_dir is not None:
+            data["download_dir"] = download_dir
+        if quality is not None:
+            data["quality"] = quality
+        data.update({k: v for k, v in extra.items() if v is not None})
         with open(CONFIG_FILE, 'w') as f:
-            json.dump({"download_dir": new_dir, "quality": new_quality}, f)
+            json.dump(data, f)
     except Exception as e:
-        logger.error(f"Failed to save config: {e}")
+        logger.error("Failed to save config: %s", e)
 
 last_heartbeat_time = time.time() + 30.0 # 30s initial grace for slower PCs
 server_should_exit = False
-progress_state = {"percent": "0%", "speed": "0KB/s", "status": "idle", "playlist_info": ""}
-CURRENT_PROCESS_FILES = [] # Track files being downloaded in current session
-cancel_requested = False # Global flag for cancellation
+# Set by run_headless. The API has no login, so desktop-only endpoints are off and downloads stay under DOWNLOAD_DIR
+HEADLESS = False
+MAX_PARALLEL_DOWNLOADS = max(1, int(get_config_value("max_parallel_downloads", 3)))
+PREEMPT_BULK_JOBS = bool(get_config_value("preempt_bulk_jobs", True)) # Pause a bulk job when an interactive one has no free worker
+PROGRESS_UPDATE_HZ = max(0.5, float(get_config_value("progress_update_hz", 4)))
+DOWNLOAD_RETRIES = max(0, int(get_config_value("download_retries", 10)))
+PLAYLIST_WORKERS = max(1, int(get_config_value("playlist_workers", 3)))
+BATCH_RESOLVE_WORKERS = max(1, int(get_config_value("batch_resolve_workers", 4)))
+# Ended jobs and batches stay listed this long, and at most this many ended jobs are kept
+JOB_RETENTION_SECONDS = max(0, int(get_config_value("job_retention_seconds", 3600)))
+MAX_ENDED_JOBS = max(1, int(get_config_value("max_ended_jobs", 200)))
+# Cleared while the FFmpeg check and the leftover sweep run in the background after startup
+startup_done = threading.Event()
+startup_done.set()
+STREAM_AUDIO = bool(get_config_value("stream_audio", True)) # Pipe audio-only downloads straight into ffmpeg
+# Progressive files of at least RANGE_MIN_SIZE bytes are fetched over this many connections, 1 turns it off
+RANGE_CONNECTIONS = max(1, int(get_config_value("range_connections", 4)))
+RANGE_MIN_SIZE = int(get_config_value("range_min_size_mb", 16)) * 1024 * 1024
+
+# Extraction results reused across retries, quality changes and re-downloads
+extraction_cache = metadata_cache.MetadataCache(
+    METADATA_CACHE_FILE,
+    ttl=int(get_config_value("metadata_cache_ttl", 3600)),
+    max_bytes=int(get_config_value("metadata_cache_max_mb", 64)) * 1024 * 1024
+)
+history_index = DownloadHistory(HISTORY_FILE)
+
+# Fragment concurrency is tuned per site from observed throughput and retries
+fragment_controller = AdaptiveConcurrency(
+    initial=int(get_config_value("fragment_concurrency", 10)),
+    minimum=int(get_config_value("fragment_concurrency_min", 1)),
+    maximum=int(get_config_value("fragment_concurrency_max", 32))
+)
+
+# Download bandwidth in bytes/s shared by running jobs, 0 means unlimited
+bandwidth_manager = BandwidthManager(int(get_config_value("bandwidth_limit", 0)) or None)
+
+# Merging and audio extraction run here so download workers can move on to the next fetch
+postprocess_pipeline = PostProcessingPipeline(get_config_value("postprocess_workers"))
+
+# HTTP sessions (keep-alive connections, cookies) shared by the jobs of one site
+session_pool = SessionPool(idle_timeout=int(get_config_value("session_idle_timeout", 300)))
+
+# Space reserved on the download volumes by running downloads; jobs fail fast below min_free_space_mb
+disk_space_manager = DiskSpaceManager(min_free=int(get_config_value("min_free_space_mb", 0)) * 1024 * 1024)
+RESERVE_DISK_SPACE = bool(get_config_value("reserve_disk_space", True))
+
+# Unfinished jobs of a previous session keep their partial files until resumed or abandoned
+download_journal = resume_journal.ResumeJournal(JOURNAL_FILE)
+download_journal.mark_all_interrupted()
+
+# Prometheus metrics served on /metrics; per-job values are recorded when a job ends
+metrics_registry = MetricsRegistry()
+jobs_total = metrics_registry.counter("videoindiren_jobs_total", "Jobs that ended, by final status", ["status"])
+downloaded_bytes_total = metrics_registry.counter(
+    "videoindiren_downloaded_bytes_total", "Bytes downloaded by ended jobs", ["extractor"])
+fragment_retries_total = metrics_registry.counter(
+    "videoindiren_fragment_retries_total", "Fragment retries of ended jobs", ["extractor"])
+queue_wait_seconds = metrics_registry.histogram(
+    "videoindiren_queue_wait_seconds", "Time a job waited in the queue before a worker started (or resumed) it", ["priority"])
+preemptions_total = metrics_registry.counter(
+    "videoindiren_preemptions_total", "Bulk jobs paused to free a worker for an interactive job")
+extraction_seconds = metrics_registry.histogram(
+    "videoindiren_extraction_seconds", "Metadata extraction time per job, cache lookups included", ["extractor"])
+ttfb_seconds = metrics_registry.histogram(
+    "videoindiren_time_to_first_byte_seconds", "Time between a worker starting a job and its first downloaded byte", ["extractor"])
+download_seconds = metrics_registry.histogram(
+    "videoindiren_download_seconds", "Time between the first and the last downloaded byte of a job", ["extractor"])
+postprocess_seconds = metrics_registry.histogram(
+    "videoindiren_postprocess_seconds", "Duration of each post-processor run", ["postprocessor"])
+job_throughput = metrics_registry.histogram(
+    "videoindiren_throughput_bytes_per_second", "Average download throughput per job", ["extractor"], THROUGHPUT_BUCKETS)
 
 # Preference Order: 1. Config File, 2. System Downloads, 3. Local Folder
 saved_dir, saved_quality = load_config()
@@ -123,99 +224,1130 @@ class DownloadRequest(BaseModel):
     quality: str = "best"
     audio_only: bool = False
     download_playlist: bool = False
+    playlist_workers: int = None # Parallel entry downloads, defaults to config
+    refresh_metadata: bool = False # Skip the extraction cache
+    force: bool = False # Download again even if the history has it
+    format_id: str = None # Exact yt-dlp format (e.g. "137+140") from /api/formats
+    rate_limit: int = Field(None, ge=1) # Own bandwidth cap in bytes/s
+    weight: float = Field(1.0, gt=0) # Share of the global bandwidth cap relative to other jobs
+    priority: Literal["interactive", "bulk"] = None # Defaults to bulk for playlists and batches
+
+# --- Job Subsystem ---
+JOB_FINAL_STATES = ("finished", "error", "cancelled", "interrupted")
+PRIORITIES = ("interactive", "bulk") # Order in which the scheduler takes queued jobs
+
+class DownloadJob:
+    """A single download with its own progress, cancel flag and temp-file set."""
+
+    def __init__(self, request):
+        self.id = str(uuid.uuid4())[:8]
+        self.request = request
+        self.status = "queued"
+        self.progress = ProgressRecord() # Replaced, never mutated, so readers need no lock
+        self.files = set() # Files being downloaded by this job
+        self.temp_paths = set() # Manifest of temporary paths the job created (.part, .ytdl, .temp.*)
+        self.fragments = {} # Manifest of fragment files: tmpfilename -> fragment count
+        self.cancel_requested = False
+        self.abandoned = False # Explicit cancel: partial files are deleted instead of kept for resume
+        self.pause_requested = None # "preempted" or "user"; stops the job through the cancel flag but keeps its files
+        self.priority = request.priority or ("bulk" if request.download_playlist else "interactive")
+        self.queued_at = self.created_at = time.time()
+        self.ended_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.version = 0 # Bumped on every progress change, read by the event stream
+        self.last_progress_emit = 0.0
+        self.entries = {} # playlist_index -> per-entry progress for parallel playlists
+        self.site = urlsplit(request.url).hostname or "unknown"
+        self.downloaders = [] # YoutubeDL instances working on this job
+        self.seen_bytes = {} # filename -> bytes seen, for throughput deltas
+        self.postprocessing = [] # Futures of post-processing handed to the pipeline
+        self.started_at = None # When a worker picked the job up
+        self.first_byte_at = None
+        self.last_byte_at = None
+        self.rate_window = [0.0, 0] # Start and bytes of the current throughput window
+        self.resume_offset = 0 # Bytes already on disk when yt-dlp resumed a partial file
+        self.pp_started = {} # (postprocessor, filepath) -> start time
+        self.stats = {
+            "fragment_concurrency": None, "fragment_retries": 0, "extractor": None,
+            "queue_wait_seconds": None, "extraction_seconds": 0.0, "time_to_first_byte_seconds": None,
+            "download_seconds": None, "postprocess_seconds": {}, "bytes_downloaded": 0,
+            "avg_throughput": None, "peak_throughput": 0, "total_seconds": None,
+        }
+
+    def mark_done(self):
+        """Ends the job for its waiters and lets go of its YoutubeDL instances."""
+        self.downloaders = []
+        self.ended_at = time.time()
+        self.done.set()
+
+    def update_progress(self, **fields):
+        self.progress = self.progress.replace(**fields)
+        self.version += 1
+
+    def set_status(self, status):
+        self.status = status
+        self.update_progress(status=status)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "url": self.request.url,
+            "status": self.status,
+            "priority": self.priority,
+            "progress": self.progress.to_dict(),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "entries": [dict(entry) for _, entry in sorted(self.entries.items())],
+            "stats": {**self.stats, "postprocess_seconds": dict(self.stats["postprocess_seconds"])},
+        }
+
+class DownloadScheduler:
+    """Runs queued download jobs on a bounded pool of worker threads, interactive jobs first.
+
+    Jobs wait in one FIFO queue per priority class. An interactive job that
+    finds every worker busy borrows the slot of the most recently started
+    bulk job: that job is paused through the cancel flag, keeps its
+    .part/.ytdl fragments and goes back to the front of the bulk queue, so
+    yt-dlp resumes it once a worker is free again. Jobs paused by the user
+    wait outside the queues until resume() is called.
+    """
+
+    def __init__(self, max_workers, preempt=True):
+        self.max_workers = max_workers
+        self.preempt = preempt
+        self.queues = {priority: collections.deque() for priority in PRIORITIES}
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.latest_job = None
+        self.running = [] # Jobs on a worker, in start order
+        self.preemptions = 0
+        self.waits = {priority: [0.0, 0] for priority in PRIORITIES} # Total queue wait and count per class
+        self._workers = []
+
+    @property
+    def active(self):
+        return len(self.running)
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, name=f"download-worker-{len(self._workers) + 1}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _enqueue(self, job, front=False):
+        """Queues a job for a worker. Caller holds the lock."""
+        job.queued_at = time.time()
+        if front:
+            self.queues[job.priority].appendleft(job)
+        else:
+            self.queues[job.priority].append(job)
+        self.wakeup.notify()
+
+    def _preemption_victim(self):
+        """The bulk job to pause so queued interactive jobs get a worker, or None. Caller holds the lock."""
+        if not self.preempt:
+            return None
+        pausing = sum(1 for job in self.running if job.pause_requested)
+        free = self.max_workers - len(self.running) + pausing
+        if len(self.queues["interactive"]) <= free:
+            return None
+        bulk = [job for job in self.running if job.priority == "bulk" and not job.cancel_requested]
+        return bulk[-1] if bulk else None
+
+    def submit(self, request):
+        job = DownloadJob(request)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.latest_job = job
+            self._ensure_workers()
+            self._enqueue(job)
+            victim = self._preemption_victim() if job.priority == "interactive" else None
+            if victim is not None:
+                self._request_pause(victim, "preempted")
+                self.preemptions += 1
+            queued = sum(len(q) for q in self.queues.values())
+        with app_logging.job_context(job.id):
+            logger.info("Queued %s job %s for URL: %s (queue size: %s)", job.priority, job.id, request.url, queued)
+        if victim is not None:
+            preemptions_total.inc()
+            logger.info("Pausing bulk job %s to free a worker for interactive job %s", victim.id, job.id)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def prune(self, retention, max_ended):
+        """Forgets ended jobs older than retention seconds and the oldest ones beyond max_ended.
+
+        Returns the removed jobs by id.
+        """
+        cutoff = time.time() - retention
+        with self.lock:
+            ended = sorted((job for job in self.jobs.values() if job.done.is_set()), key=lambda job: job.ended_at)
+            excess = len(ended) - max_ended
+            removed = {job.id: job for position, job in enumerate(ended)
+                       if position < excess or job.ended_at < cutoff}
+            for job_id in removed:
+                del self.jobs[job_id]
+        return removed
+
+    def list_jobs(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.abandoned = True
+        job.pause_requested = None
+        job.cancel_requested = True
+        if job.status == "paused":
+            with self.lock:
+                waiting = job not in self.running
+                if waiting and job in self.queues[job.priority]:
+                    self.queues[job.priority].remove(job)
+            if waiting:
+                # No worker will pick it up again, so end it here
+                fail_download(job, ValueError("DOWNLOAD_CANCELLED"))
+                record_job_metrics(job)
+                job.mark_done()
+        return job
+
+    def _request_pause(self, job, reason):
+        """Stops a running job at its next progress update. Caller holds the lock."""
+        job.pause_requested = reason
+        job.cancel_requested = True
+
+    def pause(self, job_id):
+        """Pauses a queued or running job until resume(); its partial files are kept."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            if job in self.running:
+                # A preempted job stays paused instead of being queued again; a cancelled one stays cancelled
+                if job.pause_requested or not job.cancel_requested:
+                    self._request_pause(job, "user")
+            elif job in self.queues[job.priority]:
+                self.queues[job.priority].remove(job)
+                job.pause_requested = "user"
+                job.set_status("paused")
+        return job
+
+    def resume(self, job_id):
+        """Queues a paused job again; yt-dlp continues from its partial files."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            if job.status == "paused" and job not in self.running and job not in self.queues[job.priority]:
+                job.pause_requested = None
+                job.cancel_requested = False
+                self._enqueue(job)
+        return job
+
+    def stats(self):
+        with self.lock:
+            queued = {priority: len(q) for priority, q in self.queues.items()}
+            return {
+                "workers": self.max_workers,
+                "queued": sum(queued.values()),
+                "queued_by_priority": queued,
+                "active": len(self.running),
+                "active_by_priority": {priority: sum(1 for job in self.running if job.priority == priority)
+                                       for priority in PRIORITIES},
+                "paused": sum(1 for job in self.jobs.values() if job.status == "paused"),
+                "preemptions": self.preemptions,
+                "avg_queue_wait_seconds": {priority: round(total / count, 3) if count else None
+                                           for priority, (total, count) in self.waits.items()},
+            }
+
+    def interrupt_all(self):
+        """Stops every job but keeps its partial files so it can be resumed later."""
+        for job in self.list_jobs():
+            job.pause_requested = None
+            job.cancel_requested = True
+            with self.lock:
+                waiting = job.status == "paused" and job not in self.running
+                if waiting and job in self.queues[job.priority]:
+                    self.queues[job.priority].remove(job)
+            if waiting:
+                fail_download(job, ValueError("DOWNLOAD_CANCELLED"))
+                job.mark_done()
+
+    def _next_job(self):
+        with self.lock:
+            while True:
+                for priority in PRIORITIES:
+                    if self.queues[priority]:
+                        job = self.queues[priority].popleft()
+                        self.running.append(job)
+                        return job
+                self.wakeup.wait()
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            with app_logging.job_context(job.id):
+                self._run(job)
+
+    def _run(self, job):
+        job.started_at = time.time()
+        waited = job.started_at - job.queued_at
+        # A preempted job adds the time it waited to be resumed
+        job.stats["queue_wait_seconds"] = round((job.stats["queue_wait_seconds"] or 0) + waited, 3)
+        queue_wait_seconds.observe(waited, priority=job.priority)
+        with self.lock:
+            self.waits[job.priority][0] += waited
+            self.waits[job.priority][1] += 1
+        handed_off = False
+        try:
+            if job.cancel_requested:
+                job.set_status("cancelled")
+                job.result = {"status": "cancelled", "message": "İndirme iptal edildi"}
+            else:
+                handed_off = run_download_job(job)
+        except Exception as e:
+            logger.error("Worker crashed on job %s: %s", job.id, e, exc_info=True)
+            job.error = str(e)
+            job.set_status("error")
+        finally:
+            with self.lock:
+                self.running.remove(job)
+                paused = job.status == "paused"
+                if paused and job.pause_requested == "preempted":
+                    # Back to the front of its class, ahead of bulk jobs that never started
+                    job.pause_requested = None
+                    job.cancel_requested = False
+                    self._enqueue(job, front=True)
+            job.version += 1
+            # Jobs still in the post-processing stage are completed by the pipeline,
+            # paused ones by a later run
+            if not handed_off and not paused:
+                record_job_metrics(job)
+                job.mark_done()
+
+scheduler = DownloadScheduler(MAX_PARALLEL_DOWNLOADS, PREEMPT_BULK_JOBS)
+
+# Anything that looks like a link in pasted text, a .txt list or a CSV cell
+URL_RE = re.compile(r'https?://[^\s,;"\'<>]+')
+
+def parse_url_list(urls=None, text=None):
+    """URLs from a list and/or free text, deduplicated by their normalized form, in input order."""
+    unique, seen, duplicates = [], set(), 0
+    for url in list(urls or []) + URL_RE.findall(text or ""):
+        url = url.strip()
+        if not url:
+            continue
+        key = metadata_cache.normalize_url(url)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        unique.append(url)
+    return unique, duplicates
+
+class DownloadBatch:
+    """URLs submitted together, tracked with one aggregate progress and a per-URL report.
+
+    Items start as "pending", are "resolving" while their metadata is
+    extracted and become "queued" once their job is submitted, or "failed"
+    when the URL could not be resolved. From then on the job decides.
+    """
+
+    def __init__(self, urls, duplicates):
+        self.id = str(uuid.uuid4())[:8]
+        self.created_at = time.time()
+        self.duplicates = duplicates
+        self.items = [{"url": url, "normalized_url": metadata_cache.normalize_url(url), "status": "pending",
+                       "title": None, "job_id": None, "error": None} for url in urls]
+
+    def to_dict(self):
+        report, counts, percent = [], {}, 0.0
+        for item in self.items:
+            row = dict(item)
+            job = scheduler.get(item["job_id"]) if item["job_id"] else None
+            if job is not None:
+                row.update(status=job.status, error=job.error, result=job.result)
+            finished = row["status"] in JOB_FINAL_STATES or row["status"] == "failed"
+            percent += 100.0 if finished else (job.progress.percent or 0.0) if job else 0.0
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+            report.append(row)
+        total = len(self.items)
+        done = sum(n for status, n in counts.items() if status in JOB_FINAL_STATES or status == "failed")
+        return {
+            "batch_id": self.id,
+            "created_at": self.created_at,
+            "total": total,
+            "duplicates": self.duplicates,
+            "counts": counts,
+            "percent": f"{percent / total:.1f}%" if total else "100%",
+            "finished": done == total,
+            "items": report,
+        }
+
+batches = {}
+
+def prune_ended():
+    """Drops ended jobs past JOB_RETENTION_SECONDS or MAX_ENDED_JOBS, then batches with none of their jobs left.
+
+    A batch item keeps the final state of its removed job, so the batch
+    report stays complete until the batch itself goes.
+    """
+    removed = scheduler.prune(JOB_RETENTION_SECONDS, MAX_ENDED_JOBS)
+    if not removed:
+        return
+    for batch in list(batches.values()):
+        for item in batch.items:
+            job = removed.get(item["job_id"])
+            if job is not None:
+                item.update(status=job.status, error=job.error, result=job.result)
+        if all(item["status"] in JOB_FINAL_STATES or item["status"] == "failed" for item in batch.items):
+            batches.pop(batch.id, None)
+    logger.info("Pruned %s ended jobs", len(removed))
+
+def run_batch(batch, base_request):
+    """Resolves the metadata of every batch URL with bounded parallelism and queues a job per URL.
+
+    The extraction lands in the metadata cache, so the jobs themselves start
+    without another extractor round-trip. Videos the download history
+    already has are queued without extracting anything; their jobs end as
+    "exists" straight from the history.
+    """
+    check_history = not base_request.force and not base_request.download_playlist
+
+    def resolve(item):
+        item["status"] = "resolving"
+        try:
+            existing = find_in_history(job_media_kind(base_request), item["url"]) if check_history else None
+            if existing and existing["exists"]:
+                meta = {'title': existing["title"]}
+            elif base_request.download_playlist:
+                meta = prescan_playlist(item["url"], base_request.refresh_metadata)
+            else:
+                meta = extract_video_info(item["url"], base_request.refresh_metadata)
+            item["title"] = (meta or {}).get('title')
+        except Exception as e:
+            logger.warning("Batch %s: could not resolve %s: %s", batch.id, item['url'], e)
+            item.update(status="failed", error=str(e))
+            return
+        job = scheduler.submit(base_request.model_copy(update={"url": item["url"], "priority": base_request.priority or "bulk"}))
+        item.update(status="queued", job_id=job.id)
+
+    with ThreadPoolExecutor(max_workers=BATCH_RESOLVE_WORKERS, thread_name_prefix=f"batch-{batch.id}") as pool:
+        list(pool.map(resolve, batch.items))
+    logger.info("Batch %s resolved: %s of %s URLs queued",
+                batch.id, sum(1 for i in batch.items if i['job_id']), len(batch.items))
+
+class ProgressPublisher:
+    """Streams coalesced job progress as Server-Sent Events.
+
+    Hooks only bump a job's version; each stream wakes up at most
+    PROGRESS_UPDATE_HZ times a second per job and sends the fields that
+    changed since its previous event, so bursts of yt-dlp callbacks collapse
+    into a single message.
+    """
+
+    def __init__(self, rate_hz):
+        self.interval = 1.0 / rate_hz
+
+    @staticmethod
+    def _snapshot(job):
+        snapshot = job.progress.to_dict()
+        snapshot["status"] = job.status
+        return snapshot
+
+    @staticmethod
+    def _event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
 
-def format_bytes(b):
-    if b is None or b == 0: return "0.0B"
-    # Using 1024 as yt-dlp uses binary prefixes for sizes
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if abs(b) < 1024.0:
-            return f"{b:3.1f}{unit}"
-        b /= 1024.0
-    return f"{b:.1f}TB"
-
-def strip_ansi(text):
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
-
-def postprocessor_hook(d):
-    global progress_state
+    async def stream(self, request, job_ids=None):
+        sent = {} # job_id -> (version, last snapshot)
+        closed = set() # jobs whose final "done" event was already sent
+        last_write = time.monotonic()
+        while True:
+            if await request.is_disconnected():
+                return
+
+            if job_ids is None:
+                jobs = scheduler.list_jobs()
+            else:
+                jobs = [job for job in (scheduler.get(job_id) for job_id in job_ids) if job]
+
+            pending = False
+            for job in jobs:
+                version, previous = sent.get(job.id, (-1, {}))
+                if job.version != version:
+                    snapshot = self._snapshot(job)
+                    changed = {k: v for k, v in snapshot.items() if previous.get(k) != v}
+                    sent[job.id] = (job.version, snapshot)
+                    if changed:
+                        yield self._event("progress", {"job_id": job.id, **changed})
+                        last_write = time.monotonic()
+
+                if job.id in closed:
+                    continue
+                if job.done.is_set():
+                    closed.add(job.id)
+                    yield self._event("done", job.to_dict())
+                    last_write = time.monotonic()
+                else:
+                    pending = True
+
+            # A stream for specific jobs ends once all of them are done
+            if job_ids is not None and not pending:
+                return
+
+            if time.monotonic() - last_write > 15:
+                yield ": keep-alive\n\n"
+                last_write = time.monotonic()
+
+            await asyncio.sleep(self.interval)
+
+progress_publisher = ProgressPublisher(PROGRESS_UPDATE_HZ)
+
+def postprocessor_hook(job, d):
+    filepath = (d.get('info_dict') or {}).get('filepath')
+    if d['status'] == 'started' and filepath:
+        # FFmpeg post-processors write "<name>.temp.<ext>" and rename it when done
+        base, ext = os.path.splitext(filepath)
+        track_temp_path(job, f"{base}.temp{ext}")
+    record_postprocessor_time(job, d)
+
+    entry = job.entries.get((d.get('info_dict') or {}).get('playlist_index'))
+    if entry is not None:
+        # Parallel playlist entries merge independently of each other
+        entry["status"] = "merging" if d['status'] == 'started' else entry["status"]
+        return
     if d['status'] == 'started':
-        progress_state.update({"status": "merging", "speed": "N/A"})
+        job.update_progress(status="merging", speed=None)
     elif d['status'] == 'finished':
-        progress_state.update({"status": "finished", "percent": "100%"})
+        job.update_progress(status="finished", percent=100.0)
 
-def progress_hook(d):
-    global progress_state, CURRENT_PROCESS_FILES, cancel_requested
-    
-    if cancel_requested:
+def record_postprocessor_time(job, d):
+    """Times each post-processor run (merge, audio extraction, move) from its started/finished hooks."""
+    name = d.get('postprocessor') or "unknown"
+    key = (name, (d.get('info_dict') or {}).get('filepath'))
+    if d['status'] == 'started':
+        job.pp_started[key] = time.monotonic()
+    elif d['status'] == 'finished' and key in job.pp_started:
+        elapsed = time.monotonic() - job.pp_started.pop(key)
+        timings = job.stats["postprocess_seconds"]
+        timings[name] = round(timings.get(name, 0) + elapsed, 3)
+        postprocess_seconds.observe(elapsed, postprocessor=name)
+
+def track_job_file(job, filename):
+    """Remembers a file a job is writing, journaling it the first time it shows up."""
+    if filename and filename not in job.files:
+        job.files.add(filename)
+        download_journal.add_file(job.id, filename)
+
+def track_temp_path(job, path):
+    """Adds a temporary path to the job's cleanup manifest."""
+    if path and path not in job.temp_paths:
+        job.temp_paths.add(path)
+        download_journal.add_temp_path(job.id, path)
+
+def record_manifest(job, d):
+    """Records the temporary files behind a running download, so cleanup never has to search for them."""
+    filename = d.get('filename')
+    tmpfilename = d.get('tmpfilename')
+    if tmpfilename and tmpfilename != filename:
+        track_temp_path(job, tmpfilename)
+    count = d.get('fragment_count')
+    if (count or d.get('range_count')) and tmpfilename:
+        track_temp_path(job, f"{filename}.ytdl")
+        if count and job.fragments.get(tmpfilename, 0) < count:
+            job.fragments[tmpfilename] = count
+            download_journal.add_fragments(job.id, tmpfilename, count)
+
+def apply_fragment_concurrency(job, value):
+    """Hands a new concurrency to every YoutubeDL of the job; used by the next fragmented download."""
+    if value is None:
+        return
+    job.stats["fragment_concurrency"] = value
+    for ydl in job.downloaders:
+        ydl.params['concurrent_fragment_downloads'] = value
+    logger.info("Fragment concurrency for %s is now %s (ID: %s)", job.site, value, job.id)
+
+def account_downloaded_bytes(job, d):
+    """Feeds new bytes into the concurrency controller and the bandwidth limiter.
+
+    Runs in yt-dlp's download thread, so the bandwidth limiter throttles a
+    job simply by sleeping here.
+    """
+    filename = d.get('filename')
+    downloaded = d.get('downloaded_bytes') or 0
+    if filename not in job.seen_bytes:
+        # A resumed file reports the bytes it already had; those were not downloaded now
+        job.seen_bytes[filename] = job.resume_offset
+    job.resume_offset = 0
+    delta = downloaded - job.seen_bytes[filename]
+    disk_space_manager.record_written(disk_space_manager.find(job.id, filename), filename,
+                                      d.get('allocated_bytes') or downloaded)
+    job.seen_bytes[filename] = downloaded
+    record_transfer(job, delta, (d.get('info_dict') or {}).get('extractor_key'))
+    if d.get('fragment_index') is not None:
+        apply_fragment_concurrency(job, fragment_controller.record_bytes(job.site, delta))
+    bandwidth_manager.throttle(job.id, delta)
+
+def record_transfer(job, nbytes, extractor=None):
+    """Updates the byte count, first/last byte times and peak throughput of a job."""
+    if nbytes <= 0:
+        return
+    now = time.time()
+    stats = job.stats
+    if extractor and stats["extractor"] is None:
+        stats["extractor"] = extractor
+    if job.first_byte_at is None:
+        job.first_byte_at = now
+        job.rate_window = [now, 0]
+        stats["time_to_first_byte_seconds"] = round(now - (job.started_at or job.created_at), 3)
+    job.last_byte_at = now
+    stats["bytes_downloaded"] += nbytes
+    job.rate_window[1] += nbytes
+    elapsed = now - job.rate_window[0]
+    if elapsed >= 1.0:
+        stats["peak_throughput"] = max(stats["peak_throughput"], int(job.rate_window[1] / elapsed))
+        job.rate_window = [now, 0]
+
+def record_extraction_time(job, started):
+    job.stats["extraction_seconds"] = round(job.stats["extraction_seconds"] + time.monotonic() - started, 3)
+
+# Retries yt-dlp reports through debug, "[download] Got error: HTTP Error 503: ... Retrying fragment 5 (1/10)...",
+# "... Retrying fragments (1/10)..." or "... Retrying (1/10)...", and fragments it skipped after the last retry
+DOWNLOAD_RETRY_RE = re.compile(r'^\[download\] (?:Got error: .*Retrying(?: fragments?(?: \d+)?)? \(\d+/\d+\)|.*Skipping fragment \d+)')
+
+class YtdlLogger:
+    """Receives yt-dlp's output for a job and turns download retries into controller feedback."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def record_retry(self):
+        self.job.stats["fragment_retries"] += 1
+        apply_fragment_concurrency(self.job, fragment_controller.record_error(self.job.site))
+
+    def debug(self, msg):
+        if DOWNLOAD_RETRY_RE.match(msg):
+            self.record_retry()
+        elif msg.startswith('[download] Resuming download at byte '):
+            self.job.resume_offset = int(msg.rsplit(' ', 1)[-1])
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        logger.warning("yt-dlp (%s): %s", self.job.id, msg)
+
+    def error(self, msg):
+        # A download that ran out of retries: "ERROR: \r[download] Got error: ... Giving up after 10 retries"
+        if '[download] Got error' in msg:
+            self.record_retry()
+        logger.error("yt-dlp (%s): %s", self.job.id, msg)
+
+def progress_hook(job, d):
+    if job.cancel_requested:
         raise ValueError("DOWNLOAD_CANCELLED")
 
     if d['status'] == 'downloading':
-        p = strip_ansi(d.get('_percent_str', '0%')).strip()
-        s = strip_ansi(d.get('_speed_str', '0KB/s')).strip()
-        filename = d.get('filename')
-        
-        dl = d.get('downloaded_bytes', 0)
-        total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-        size_info = f"{format_bytes(dl)} / {format_bytes(total)}"
-        
-        # Playlist info - try both top-level and info_dict (some extractors use different levels)
-        info_dict = d.get('info_dict', {})
-        playlist_index = d.get('playlist_index') or info_dict.get('playlist_index')
-        n_entries = d.get('n_entries') or info_dict.get('n_entries')
-        
-        playlist_info = ""
-        if playlist_index is not None and n_entries is not None:
-            playlist_info = f"{playlist_index} / {n_entries}"
+        record_manifest(job, d)
+        account_downloaded_bytes(job, d)
 
-        if filename and filename not in CURRENT_PROCESS_FILES:
-            CURRENT_PROCESS_FILES.append(filename)
-        
-        progress_state.update({
-            "percent": p, 
-            "speed": s, 
-            "size_info": size_info,
-            "playlist_info": playlist_info,
-            "status": "downloading"
-        })
+    info_dict = d.get('info_dict') or {}
+    entry = job.entries.get(info_dict.get('playlist_index'))
+    if entry is not None:
+        entry_progress_hook(job, entry, d)
+        return
+
+    if d['status'] == 'downloading':
+        track_job_file(job, d.get('filename'))
+
+        # yt-dlp can call this hundreds of times a second with concurrent fragments;
+        # only publish a new record at the publisher rate
+        now = time.monotonic()
+        if job.status == "downloading" and now - job.last_progress_emit < progress_publisher.interval:
+            return
+        job.last_progress_emit = now
+
+        dl = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+
+        job.status = "downloading"
+        job.update_progress(
+            percent=min(100.0, dl * 100.0 / total) if total else job.progress.percent,
+            speed=d.get('speed') or 0,
+            downloaded=dl,
+            total=total,
+            # Playlist info - try both top-level and info_dict (some extractors use different levels)
+            playlist_index=d.get('playlist_index') or info_dict.get('playlist_index'),
+            playlist_count=d.get('n_entries') or info_dict.get('n_entries'),
+            status="downloading"
+        )
     elif d['status'] == 'finished':
-        filename = d.get('filename')
         # On success, immediately remove from cleanup list so it's persisted even on late cancel
-        if filename and filename in CURRENT_PROCESS_FILES:
-            CURRENT_PROCESS_FILES.remove(filename)
+        job.files.discard(d.get('filename'))
 
-        progress_state.update({
-            "percent": "100%", 
-            "speed": "0KB/s", 
-            "status": "finished"
+        total = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+        job.update_progress(percent=100.0, speed=0, downloaded=total, total=total, status="finished")
+
+def entry_progress_hook(job, entry, d):
+    filename = d.get('filename')
+    if d['status'] == 'downloading':
+        track_job_file(job, filename)
+        dl = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        entry.update({
+            "status": "downloading",
+            "percent": min(100.0, dl * 100.0 / total) if total else entry["percent"],
+            "speed": d.get('speed') or 0,
         })
+    elif d['status'] == 'finished':
+        job.files.discard(filename)
+        entry["speed"] = 0
 
-@app.get("/api/progress")
-async def get_progress():
-    return progress_state
+    now = time.monotonic()
+    if now - job.last_progress_emit >= progress_publisher.interval:
+        job.last_progress_emit = now
+        publish_playlist_progress(job)
 
-@app.post("/api/cancel")
-async def cancel_download():
-    global cancel_requested
-    cancel_requested = True
-    return {"status": "cancel_requested"}
+def publish_playlist_progress(job):
+    """Aggregates per-entry progress of a parallel playlist into the job progress."""
+    entries = list(job.entries.values())
+    if not entries:
+        return
+    done = sum(1 for e in entries if e["status"] in ("finished", "skipped", "error"))
+    percent = sum(100.0 if e["status"] in ("finished", "skipped", "error") else e["percent"] for e in entries) / len(entries)
+    active = [e for e in entries if e["status"] in ("downloading", "merging", "postprocessing")]
+    speed = sum(e["speed"] for e in active if e["status"] == "downloading")
+    # Once all entries are fetched the job stays in the post-processing stage
+    status = "postprocessing" if job.status == "postprocessing" else "downloading"
+    job.status = status
+    job.update_progress(
+        percent=percent,
+        speed=speed,
+        downloaded=done,
+        total=len(entries),
+        unit="video",
+        playlist_index=done,
+        playlist_count=len(entries),
+        active_entries=tuple((e["index"], e["title"], e["percent"], e["status"]) for e in active),
+        status=status
+    )
 
-@app.post("/api/download")
-async def download_video(request: DownloadRequest):
-    global progress_state, CURRENT_PROCESS_FILES, cancel_requested
+def job_media_kind(request):
+    return "audio" if request.audio_only else "video"
+
+def find_in_history(kind, url, ie_key=None, video_id=None):
+    """Looks a video up in the download history without touching the network."""
+    if ie_key and ie_key != 'Generic' and video_id:
+        video_key = f"{ie_key}:{video_id}"
+    else:
+        video_key = metadata_cache.url_to_video_key(url) if url else None
+    return history_index.find(kind, video_key, url)
+
+def known_playlist_entries(job, meta):
+    """Maps playlist_index -> history record for entries downloaded before."""
+    if job.request.force:
+        return {}
+    kind = job_media_kind(job.request)
+    known = {}
+    for position, entry in enumerate(meta.get('entries') or [], start=1):
+        if not entry:
+            continue
+        record = find_in_history(kind, entry.get('url'), entry.get('ie_key'), entry.get('id'))
+        if record and record["exists"]:
+            known[entry.get('playlist_index') or position] = record
+    return known
+
+def record_in_history(job, info):
+    """Adds a file the job finished to the download history."""
+    request = job.request
     url = request.url
-    download_id = str(uuid.uuid4())[:8]
-    
-    # Reset state for new download
-    cancel_requested = False
-    progress_state = {"percent": "0%", "speed": "0KB/s", "status": "starting", "playlist_info": ""}
+    if request.download_playlist:
+        url = info.get('original_url') or info.get('webpage_url') or url
+    try:
+        history_index.record(job_media_kind(request), url, info, info.get('filepath'))
+    except Exception as e:
+        logger.warning("Failed to record %s in download history: %s", info.get('id'), e)
+
+@functools.lru_cache(maxsize=None)
+def downloader_classes():
+    """The job's YoutubeDL and post-processor subclasses.
+
+    Built on first use, so yt_dlp is imported by the first job (or the
+    background warm-up) instead of delaying the server start.
+    """
+    import yt_dlp
+
+    class HistoryRecorderPP(yt_dlp.postprocessor.PostProcessor):
+        """Adds every file a job finishes to the download history."""
+
+        def __init__(self, job):
+            super().__init__()
+            self.job = job
+
+        def run(self, info):
+            record_in_history(self.job, info)
+            return [], info
+
+    class PooledYoutubeDL(yt_dlp.YoutubeDL):
+        """YoutubeDL that borrows the HTTP session of its site from the session pool."""
+
+        def __init__(self, params, site):
+            super().__init__(params)
+            session_pool.attach(self, site)
+
+        def close(self):
+            session_pool.release(self)
+            super().close()
+
+    class PipelinedYoutubeDL(PooledYoutubeDL):
+        """YoutubeDL that hands the post-processing of each finished download to the pipeline.
+
+        process_info() returns as soon as the bytes are on disk, so the calling
+        worker can start its next fetch while ffmpeg merges or transcodes.
+        """
+
+        def __init__(self, params, job):
+            super().__init__(params, job.site)
+            self.job = job
+            self.reservation = None # Disk space of the download in process_info()
+
+        def process_info(self, info_dict):
+            if not self.job.request.download_playlist:
+                # The whole selection ("137+140"), the stream hooks only ever see one half of it
+                download_journal.set_format(self.job.id, info_dict.get('format_id'))
+            self.reservation = reserve_disk_space(self.job, self, info_dict)
+            try:
+                return super().process_info(info_dict)
+            finally:
+                # Unless post_process() handed it to the pipeline
+                disk_space_manager.release(self.reservation)
+                self.reservation = None
+
+        def dl(self, name, info, subtitle=False, test=False):
+            # Plain single-file HTTP downloads go to the range-splitting downloader
+            if (subtitle or test or name == '-' or self.params.get('range_connections', 1) <= 1
+                    or info.get('requested_formats') or info.get('fragments')
+                    or yt_dlp.utils.determine_protocol(info) not in ('http', 'https')):
+                return super().dl(name, info, subtitle, test)
+            fd = range_downloader.range_fd_class()(self, self.params)
+            for hook in self._progress_hooks:
+                fd.add_progress_hook(hook)
+            new_info = self._copy_infodict(info)
+            if new_info.get('http_headers') is None:
+                new_info['http_headers'] = self._calc_headers(new_info)
+            return fd.download(name, new_info, subtitle)
+
+        def post_process(self, filename, info, files_to_move=None):
+            future = postprocess_pipeline.submit(super().post_process, filename, dict(info), files_to_move)
+            self.job.postprocessing.append(future)
+            reservation, self.reservation = self.reservation, None
+            future.add_done_callback(lambda f: disk_space_manager.release(reservation))
+            entry = self.job.entries.get(info.get('playlist_index'))
+            if entry is not None:
+                entry["status"] = "postprocessing"
+                future.add_done_callback(lambda f: entry_postprocessed(self.job, entry, f))
+            info['filepath'] = filename
+            return info
+
+    return PipelinedYoutubeDL, HistoryRecorderPP, PooledYoutubeDL
+
+def reserve_disk_space(job, ydl, info, keeps_input=True):
+    """Reserves the estimated peak size of one download on its volume, None without an estimate.
+
+    Waits while other downloads hold space there; raises DiskSpaceError
+    when the download cannot fit.
+    """
+    estimate = estimate_download_size(info)
+    if not RESERVE_DISK_SPACE or not estimate:
+        return None
+    if keeps_input and (info.get('requested_formats') or job.request.audio_only):
+        # Merging and audio extraction keep their inputs until the output is complete
+        estimate *= 2
+    filename = ydl.prepare_filename(info)
+    reservation = disk_space_manager.reserve(
+        job.id, os.path.dirname(os.path.abspath(filename)), estimate, f"{os.path.splitext(filename)[0]}.",
+        should_stop=lambda: job.cancel_requested,
+        on_wait=lambda: job.set_status("waiting_for_space"))
+    if reservation is None:
+        raise ValueError("DOWNLOAD_CANCELLED")
+    return reservation
+
+def entry_postprocessed(job, entry, future):
+    error = future.exception()
+    if error is not None:
+        logger.warning("Post-processing of playlist entry %s of job %s failed: %s", entry['index'], job.id, error)
+        entry.update({"status": "error", "error": str(error)})
+    else:
+        entry["status"] = "finished"
+    publish_playlist_progress(job)
+
+def create_probe(opts, url):
+    """YoutubeDL for metadata extraction, on the shared HTTP session of the URL's site."""
+    PooledYoutubeDL = downloader_classes()[2]
+    return PooledYoutubeDL(opts, urlsplit(url).hostname or "unknown")
+
+def create_downloader(job, opts):
+    """Creates a YoutubeDL instance wired up to a job."""
+    PipelinedYoutubeDL, HistoryRecorderPP, _ = downloader_classes()
+    ydl = PipelinedYoutubeDL(opts, job)
+    ydl.add_post_processor(HistoryRecorderPP(job), when='after_move')
+    job.downloaders.append(ydl)
+    return ydl
+
+def download_playlist_entries(job, meta, ydl_opts, output_template, workers):
+    """Fans the pre-scanned entries of a playlist out across parallel yt-dlp workers.
+
+    Every worker owns one YoutubeDL instance and pulls the next entry from a
+    shared queue. The playlist fields are injected through extra_info so the
+    zero-padded %(playlist_index)s naming stays the same as a sequential run.
+    """
+    playlist_fields = {
+        'playlist': meta.get('title') or meta.get('id'),
+        'playlist_id': meta.get('id'),
+        'playlist_title': meta.get('title'),
+        'playlist_count': meta.get('playlist_count'),
+    }
+    known = known_playlist_entries(job, meta)
+    pending = queue.Queue()
+    for position, entry in enumerate(meta.get('entries') or [], start=1):
+        if not entry:
+            continue
+        index = entry.get('playlist_index') or position
+        job.entries[index] = {
+            "index": index, "title": entry.get('title') or entry.get('id'),
+            "status": "queued", "percent": 0.0, "speed": 0, "filename": None, "error": None,
+        }
+        if index in known:
+            # Downloaded before, no need to touch the network for it
+            job.entries[index].update({"status": "skipped", "percent": 100.0, "filename": known[index]["path"]})
+            continue
+        pending.put((index, entry))
+    n_entries = len(job.entries)
+    if known:
+        logger.info("Skipping %s playlist entries found in the download history (ID: %s)", len(known), job.id)
+
+    entry_opts = ydl_opts.copy()
+    entry_opts.update({'outtmpl': output_template, 'noplaylist': True})
+
+    def worker():
+        with app_logging.job_context(job.id), create_downloader(job, entry_opts) as ydl:
+            while not job.cancel_requested:
+                try:
+                    index, entry = pending.get_nowait()
+                except queue.Empty:
+                    return
+                state = job.entries[index]
+                state["status"] = "downloading"
+                try:
+                    # Resolve the flat entry exactly like yt-dlp's own playlist loop would
+                    info = ydl.process_ie_result(dict(entry), download=True,
+                                                 extra_info={**playlist_fields, 'playlist_index': index, 'n_entries': n_entries})
+                    state.update({"percent": 100.0, "filename": ydl.prepare_filename(info)})
+                    if state["status"] == "downloading":
+                        state["status"] = "finished"
+                except Exception as e:
+                    if job.cancel_requested:
+                        return
+                    logger.warning("Playlist entry %s of job %s failed: %s", index, job.id, e)
+                    state.update({"status": "error", "error": str(e)})
+                finally:
+                    publish_playlist_progress(job)
+
+    logger.info("Downloading %s playlist entries with %s parallel workers (ID: %s)", n_entries, workers, job.id)
+    threads = [threading.Thread(target=worker, name=f"{job.id}-entry-{i + 1}", daemon=True) for i in range(min(workers, pending.qsize()))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if job.cancel_requested:
+        raise ValueError("DOWNLOAD_CANCELLED")
+
+    finished = [e for e in job.entries.values() if e["status"] in ("finished", "skipped", "postprocessing") and e["filename"]]
+    if not finished:
+        failed = [e["error"] for e in job.entries.values() if e["error"]]
+        raise Exception(failed[0] if failed else "Playlist contains no downloadable entries")
+    return os.path.dirname(finished[0]["filename"])
+
+# Download errors meaning the stream URLs in cached metadata are no longer valid, e.g.
+# "unable to download video data: HTTP Error 403: Forbidden" or "HTTP Error 410: Gone"
+STALE_FORMAT_RE = re.compile(r'HTTP Error (?:403|410)\b|\bexpired\b', re.IGNORECASE)
+
+def download_with_cache(ydl, url, refresh=False, process=None):
+    """Downloads a single video, reusing a cached info dict to skip the extractor round-trip.
+
+    process(info) downloads a single video's info dict and defaults to
+    yt-dlp's process_ie_result. Only errors that mean the cached stream
+    URLs went stale lead to a fresh extraction; anything else is raised.
+    """
+    if process is None:
+        process = lambda info: ydl.process_ie_result(info, download=True)
+    started = time.monotonic()
+    cached = None if refresh else extraction_cache.get(url)
+    record_extraction_time(ydl.job, started)
+    if cached is not None:
+        logger.info("Using cached metadata for URL: %s", url)
+        try:
+            return process(cached)
+        except Exception as e:
+            if not STALE_FORMAT_RE.search(str(e)):
+                raise
+            logger.warning("Cached metadata failed for %s, extracting again: %s", url, e)
+            extraction_cache.invalidate(url)
+
+    started = time.monotonic()
+    info = ydl.extract_info(url, download=False)
+    record_extraction_time(ydl.job, started)
+    if info.get('_type', 'video') != 'video':
+        return ydl.process_ie_result(info, download=True)
+    info = ydl.sanitize_info(info, remove_private_keys=True)
+    extraction_cache.put(url, info)
+    return process(info)
+
+def download_audio(job, ydl, info):
+    """Audio-only download of a single video, streamed into ffmpeg when the selected format allows it.
+
+    The choice is made from the selected format before anything is
+    fetched; fragmented formats and separate streams take the regular
+    download + FFmpegExtractAudio path.
+    """
+    selected = ydl.process_ie_result(info, download=False)
+    if audio_stream.is_streamable(selected) and stream_audio_download(job, ydl, selected):
+        return selected # finish_download finds the .mp3 next to the source name
+    return ydl.process_ie_result(info, download=True)
+
+def stream_audio_download(job, ydl, selected):
+    """Pipes the selected audio format straight into ffmpeg's mp3 encoder.
+
+    Returns the mp3 path, or None when the stream could not be opened, so
+    the caller can still download the regular way. A failure after bytes
+    were received is raised: falling back then would fetch them twice.
+    """
+    target = os.path.splitext(ydl.prepare_filename(selected))[0] + '.mp3'
+    if os.path.exists(target):
+        return target # Same as nooverwrites on the regular path
+
+    received = 0
+
+    def report(downloaded, total, speed):
+        nonlocal received
+        received = downloaded
+        progress_hook(job, {
+            'status': 'downloading',
+            'filename': target,
+            'tmpfilename': f"{target}.part",
+            'info_dict': selected,
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'speed': speed,
+        })
+
+    # Only the mp3 is written, there is no source file to keep until the end
+    reservation = reserve_disk_space(job, ydl, selected, keeps_input=False)
+    logger.info("Streaming audio format %s into ffmpeg (ID: %s)", selected.get('format_id'), job.id)
+    from yt_dlp.networking import Request
+    try:
+        request = Request(selected['url'], headers=selected.get('http_headers'))
+        with ydl.urlopen(request) as response:
+            total = int(response.headers.get('Content-Length') or 0) or selected.get('filesize')
+            downloaded = audio_stream.stream_to_mp3(response, target, report, total=total)
+    except Exception as e:
+        if str(e) == "DOWNLOAD_CANCELLED" or job.cancel_requested or received:
+            raise
+        logger.warning("Audio streaming failed for %s, using a regular download: %s", job.request.url, e)
+        return None
+    finally:
+        disk_space_manager.release(reservation)
+
+    progress_hook(job, {'status': 'finished', 'filename': target, 'info_dict': selected, 'downloaded_bytes': downloaded})
+    record_in_history(job, {**selected, 'filepath': target})
+    return target
+
+PROBE_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    'nocheckcertificate': True,
+    'geo_bypass': True,
+}
+
+def extract_video_info(url, refresh=False):
+    """Info dict of a single video, served from the extraction cache when possible.
+
+    Anything that is not a single video is returned as extracted and not cached.
+    """
+    info = None if refresh else extraction_cache.get(url)
+    if info is None:
+        with create_probe(PROBE_OPTS, url) as ydl:
+            info = ydl.extract_info(url, download=False)
+            if info.get('_type', 'video') != 'video':
+                return info
+            info = ydl.sanitize_info(info, remove_private_keys=True)
+        extraction_cache.put(url, info)
+    return info
+
+def prescan_playlist(url, refresh=False):
+    """Flat playlist extraction, cached so the download itself can reuse it."""
+    meta = None if refresh else extraction_cache.get(url, namespace='playlist')
+    if meta is None:
+        with create_probe({'extract_flat': True, 'quiet': True, 'nocheckcertificate': True}, url) as ydl_meta:
+            meta = ydl_meta.sanitize_info(ydl_meta.extract_info(url, download=False))
+        if meta and 'entries' in meta:
+            extraction_cache.put(url, meta, namespace='playlist')
+    return meta
+
+def probe_formats(url, refresh=False):
+    """Format ladder of a single video, served from the extraction cache when possible."""
+    info = extract_video_info(url, refresh)
+    if info.get('_type', 'video') != 'video':
+        raise HTTPException(status_code=400, detail="Formats can only be listed for a single video")
+    return format_selection.build_format_ladder(info)
+
+def run_download_job(job):
+    """Runs the fetch phase of a queued job on the calling worker thread.
+
+    Returns True when the job was handed to the post-processing pipeline,
+    which then completes it.
+    """
+    request = job.request
+    url = request.url
+    download_id = job.id
+    job.set_status("starting")
+    # Jobs queued right after launch must not race the FFmpeg setup or the sweep
+    startup_done.wait()
     
     # Determine the download directory
     current_download_dir = DOWNLOAD_DIR
     if request.download_dir and os.path.exists(request.download_dir):
         current_download_dir = request.download_dir
     
-    logger.info(f"Received download request for URL: {url} (ID: {download_id}, Quality: {request.quality}, Audio: {request.audio_only}, Playlist: {request.download_playlist})")
+    logger.info("Received download request for URL: %s (ID: %s, Quality: %s, Audio: %s, Playlist: %s)",
+                url, download_id, request.quality, request.audio_only, request.download_playlist)
+
+    # Duplicate check against the history index, before any network call
+    if not request.force and not request.download_playlist:
+        existing = find_in_history(job_media_kind(request), url)
+        # A record whose file was deleted or moved away does not count, download it again
+        if existing and existing["exists"]:
+            logger.info("Skipping download %s, already downloaded to: %s", download_id, existing['path'])
+            job.result = {
+                "status": "exists",
+                "message": "Bu video daha önce indirildi",
+                "filename": os.path.basename(existing["path"] or ""),
+                "full_path": existing["path"],
+                "history": existing
+            }
+            job.update_progress(percent=100.0)
+            job.set_status("finished")
+            return
     
     # Template: Include playlist index if it's a playlist to avoid name collisions
     if request.download_playlist:
@@ -230,11 +1362,17 @@ async def download_video(request: DownloadRequest):
         'no_warnings': True,
         'nocolor': True,
         'restrictfilenames': False,
-        'progress_hooks': [progress_hook],
-        'postprocessor_hooks': [postprocessor_hook],
+        'progress_hooks': [lambda d: progress_hook(job, d)],
+        'postprocessor_hooks': [lambda d: postprocessor_hook(job, d)],
         'noplaylist': not request.download_playlist,
         'nooverwrites': True, # Skip if file exists
-        'concurrent_fragment_downloads': 10, # Keep fast fragments
+        'concurrent_fragment_downloads': fragment_controller.get(job.site), # Adapted per site
+        # yt-dlp's API defaults to no retries; the CLI's 10 also feeds the controller's back-off
+        'retries': DOWNLOAD_RETRIES,
+        'fragment_retries': DOWNLOAD_RETRIES,
+        'range_connections': RANGE_CONNECTIONS,
+        'range_min_size': RANGE_MIN_SIZE,
+        'logger': YtdlLogger(job),
         'nocheckcertificate': True,
         'geo_bypass': True,
         'prefer_ffmpeg': True,
@@ -248,93 +1386,476 @@ async def download_video(request: DownloadRequest):
     }
 
     if request.audio_only:
-        ydl_opts['format'] = 'bestaudio/best'
+        ydl_opts['format'] = request.format_id or 'bestaudio/best'
         ydl_opts['postprocessors'] = [{
             'key': 'FFmpegExtractAudio',
             'preferredcodec': 'mp3',
             'preferredquality': '192',
         }]
     else:
-        # Dynamic format selection based on quality
-        if request.quality == "4k":
-            fmt = 'bestvideo[height<=2160][ext=mp4]+bestaudio[ext=m4a]/best[height<=2160]/best'
-        elif request.quality == "1080p":
-            fmt = 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080]/best'
-        elif request.quality == "720p":
-            fmt = 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720]/best'
-        elif request.quality == "480p":
-            fmt = 'bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/best[height<=480]/best'
-        else: # best
-            fmt = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
-        
-        ydl_opts['format'] = fmt
-        ydl_opts['merge_output_format'] = 'mp4'
+        # A pinned format skips selector evaluation, otherwise select by quality preset
+        ydl_opts['format'] = request.format_id or format_selection.quality_selector(request.quality)
+        # Pinned pairs also go into the first container their codecs can be stream-copied into
+        ydl_opts['merge_output_format'] = '/'.join(format_selection.CONTAINERS)
 
     def execute_download():
         target_template = output_template
+        meta, count = None, 0
         
         # Dynamic numbering for playlists
         if request.download_playlist:
             try:
-                # Fast pre-scan to get entry count
-                with yt_dlp.YoutubeDL({'extract_flat': True, 'quiet': True, 'nocheckcertificate': True}) as ydl_meta:
-                    meta = ydl_meta.extract_info(url, download=False)
-                    if meta and 'entries' in meta:
-                        count = len(list(meta['entries']))
-                        padding = "03d" if count >= 100 else ("02d" if count >= 10 else "s")
-                        target_template = f"{current_download_dir}/%(playlist_title)s/%(playlist_index){padding} - %(title)s.%(ext)s"
-                        logger.info(f"Playlist detected with {count} entries. Using padding: {padding}")
+                # Fast pre-scan to get entry count; its result is reused for the download itself
+                started = time.monotonic()
+                meta = prescan_playlist(url, request.refresh_metadata)
+                record_extraction_time(job, started)
+                if meta and 'entries' in meta:
+                    count = sum(1 for entry in meta['entries'] if entry)
+                    padding = "03d" if count >= 100 else ("02d" if count >= 10 else "s")
+                    target_template = f"{current_download_dir}/%(playlist_title)s/%(playlist_index){padding} - %(title)s.%(ext)s"
+                    logger.info("Playlist detected with %s entries. Using padding: %s", count, padding)
             except Exception as e:
-                logger.warning(f"Failed to pre-scan playlist for numbering: {e}")
+                logger.warning("Failed to pre-scan playlist for numbering: %s", e)
+
+        # Fan the pre-scanned entries out across parallel workers
+        workers = request.playlist_workers or PLAYLIST_WORKERS
+        if count > 1 and workers > 1:
+            return download_playlist_entries(job, meta, ydl_opts, target_template, workers)
 
         final_opts = ydl_opts.copy()
         final_opts['outtmpl'] = target_template
 
-        with yt_dlp.YoutubeDL(final_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+        # Only fetch the playlist entries that are not in the history yet
+        known = known_playlist_entries(job, meta) if count else {}
+        if known:
+            indices = [entry.get('playlist_index') or position
+                       for position, entry in enumerate(meta['entries'], start=1) if entry]
+            new_items = [str(index) for index in indices if index not in known]
+            logger.info("Skipping %s playlist entries found in the download history (ID: %s)", len(known), download_id)
+            if not new_items:
+                return os.path.dirname(next(iter(known.values()))["path"])
+            final_opts['playlist_items'] = ",".join(new_items)
+
+        with create_downloader(job, final_opts) as ydl:
+            if meta:
+                # Resolve the pre-scanned entries instead of crawling the playlist pages again
+                info = ydl.process_ie_result(meta, download=True)
+            else:
+                process = functools.partial(download_audio, job, ydl) if request.audio_only and STREAM_AUDIO else None
+                info = download_with_cache(ydl, url, request.refresh_metadata, process)
             # Use prepare_filename on the top-level info
             return ydl.prepare_filename(info)
 
+    job.stats["fragment_concurrency"] = ydl_opts['concurrent_fragment_downloads']
+    if download_journal.get(job.id) is None:
+        # A resumed pause keeps the manifest of its earlier run
+        download_journal.start(job.id, url, request.model_dump(exclude_none=True), current_download_dir)
+    bandwidth_manager.register(job.id, request.rate_limit or None, request.weight)
+
     try:
-        logger.info(f"Starting download for ID: {download_id}")
-        
-        # Run blocking yt-dlp call in a separate thread to keep event loop free
-        filename = await anyio.to_thread.run_sync(execute_download)
-
-        # Post-download check for extension changes
-        if not os.path.exists(filename):
-            base = os.path.splitext(filename)[0]
-            for ext in ['mp4', 'mkv', 'webm']:
-                if os.path.exists(f"{base}.{ext}"):
-                    filename = f"{base}.{ext}"
-                    break
-        
-        full_path = os.path.abspath(filename)
-        logger.info(f"Download successful for ID: {download_id}. Saved to: {full_path}")
-            
-        # Remove from cleanup list on success
-        if filename in CURRENT_PROCESS_FILES:
-            CURRENT_PROCESS_FILES.remove(filename)
-        
-        return {
-            "status": "success",
-            "message": "Video downloaded successfully",
-            "filename": os.path.basename(filename),
-            "full_path": full_path
-        }
+        logger.info("Starting download for ID: %s", download_id)
+        disk_space_manager.check_free(current_download_dir)
+
+        filename = execute_download()
+
+        if job.postprocessing:
+            # The worker is free again, the pipeline completes the job
+            logger.info("Download %s fetched, %s post-processing tasks queued", download_id, len(job.postprocessing))
+            job.set_status("postprocessing")
+            complete_after_postprocessing(job, filename)
+            return True
+        finish_download(job, filename)
 
     except Exception as e:
-        if str(e) == "DOWNLOAD_CANCELLED":
-            logger.info(f"Download {download_id} was cancelled by user.")
-            progress_state["status"] = "cancelled"
-            cleanup_interrupted_downloads()
-            return {"status": "cancelled", "message": "İndirme iptal edildi"}
+        fail_download(job, e)
+    finally:
+        bandwidth_manager.unregister(job.id)
+    return False
+
+def finish_download(job, filename):
+    # Post-download check for extension changes
+    if not os.path.exists(filename):
+        base = os.path.splitext(filename)[0]
+        for ext in ['mp4', 'mkv', 'webm', 'mp3']:
+            if os.path.exists(f"{base}.{ext}"):
+                filename = f"{base}.{ext}"
+                break
+    
+    full_path = os.path.abspath(filename)
+    logger.info("Download successful for ID: %s. Saved to: %s", job.id, full_path)
         
-        logger.error(f"Download error for ID {download_id}: {str(e)}", exc_info=True)
-        print(f"Download error: {str(e)}")
-        progress_state["status"] = "error"
+    # Remove from cleanup list on success
+    job.files.discard(filename)
+    download_journal.remove(job.id)
+    
+    job.result = {
+        "status": "success",
+        "message": "Video downloaded successfully",
+        "filename": os.path.basename(filename),
+        "full_path": full_path
+    }
+    job.update_progress(percent=100.0)
+    job.set_status("finished")
+
+def fail_download(job, e):
+    download_id = job.id
+    if job.pause_requested:
+        # Keeps the fragments and the journal entry, the next run resumes from them
+        logger.info("Download %s paused (%s), keeping partial files.", download_id, job.pause_requested)
+        job.set_status("paused")
+        return
+    if str(e) == "DOWNLOAD_CANCELLED" or job.cancel_requested:
+        if not job.abandoned:
+            # Interrupted by shutdown, keep the fragments for a later resume
+            logger.info("Download %s was interrupted, keeping partial files for resume.", download_id)
+            job.set_status("interrupted")
+            download_journal.mark(job.id, "interrupted")
+            job.result = {"status": "interrupted", "message": "İndirme durduruldu"}
+            return
+        logger.info("Download %s was cancelled by user.", download_id)
+        job.set_status("cancelled")
+        cleanup_job_files(job)
+        download_journal.remove(job.id)
+        job.result = {"status": "cancelled", "message": "İndirme iptal edildi"}
+        return
+    
+    logger.error("Download error for ID %s: %s", download_id, str(e), exc_info=True)
+    job.error = str(e)
+    job.set_status("error")
+    entry = download_journal.get(job.id)
+    if entry and entry["files"]:
+        download_journal.mark(job.id, "failed")
+    else:
+        download_journal.remove(job.id)
+
+def complete_after_postprocessing(job, filename):
+    """Finishes a job on the pipeline thread once its last post-processing task is done.
+
+    A failed entry of a playlist only marks that entry; for a single video
+    the post-processing error fails the job.
+    """
+    pending = list(job.postprocessing)
+    lock = threading.Lock()
+    remaining = len(pending)
+
+    def on_done(_):
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining:
+                return
+        with app_logging.job_context(job.id):
+            try:
+                errors = [f.exception() for f in pending if f.exception() is not None]
+                if errors and not job.request.download_playlist:
+                    raise errors[0]
+                finish_download(job, filename)
+            except Exception as e:
+                fail_download(job, e)
+            finally:
+                job.version += 1
+                record_job_metrics(job)
+                job.mark_done()
+
+    for future in pending:
+        future.add_done_callback(on_done)
+
+def record_job_metrics(job):
+    """Completes the job's stats and adds them to the Prometheus metrics; called once when the job ends."""
+    stats = job.stats
+    stats["total_seconds"] = round(time.time() - job.created_at, 3)
+    extractor = stats["extractor"] or "unknown"
+    if job.first_byte_at is not None:
+        elapsed = job.last_byte_at - job.first_byte_at
+        stats["download_seconds"] = round(elapsed, 3)
+        if elapsed > 0:
+            stats["avg_throughput"] = int(stats["bytes_downloaded"] / elapsed)
+            stats["peak_throughput"] = max(stats["peak_throughput"], stats["avg_throughput"])
+            job_throughput.observe(stats["avg_throughput"], extractor=extractor)
+        ttfb_seconds.observe(stats["time_to_first_byte_seconds"], extractor=extractor)
+        download_seconds.observe(elapsed, extractor=extractor)
+
+    jobs_total.inc(status=job.status)
+    downloaded_bytes_total.inc(stats["bytes_downloaded"], extractor=extractor)
+    fragment_retries_total.inc(stats["fragment_retries"], extractor=extractor)
+    if job.started_at is not None:
+        extraction_seconds.observe(stats["extraction_seconds"], extractor=extractor)
+    logger.info("Job %s stats: %s", job.id, json.dumps(stats))
+
+IDLE_PROGRESS = {"percent": "0%", "speed": "0KB/s", "status": "idle", "playlist_info": ""}
+
+@app.get("/api/progress")
+async def get_progress():
+    job = scheduler.latest_job
+    return job.progress.to_dict() if job else IDLE_PROGRESS
+
+@app.post("/api/cancel")
+async def cancel_download():
+    job = scheduler.latest_job
+    if job:
+        scheduler.cancel(job.id)
+    return {"status": "cancel_requested"}
+
+def checked_download_dir(download_dir):
+    """Resolves a requested folder against DOWNLOAD_DIR; a headless server refuses folders outside of it."""
+    if not download_dir:
+        return download_dir
+    path = os.path.abspath(os.path.join(DOWNLOAD_DIR, os.path.expanduser(download_dir)))
+    if HEADLESS:
+        root = os.path.realpath(DOWNLOAD_DIR)
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            raise HTTPException(status_code=403, detail=f"Download folder must be inside {DOWNLOAD_DIR}")
+    return path
+
+def require_desktop():
+    if HEADLESS:
+        raise HTTPException(status_code=403, detail="Not available on a headless server")
+
+@app.post("/api/jobs")
+async def create_job(request: DownloadRequest):
+    request.download_dir = checked_download_dir(request.download_dir)
+    prune_ended()
+    job = scheduler.submit(request)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return {"jobs": [job.to_dict() for job in scheduler.list_jobs()]}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    if scheduler.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(progress_publisher.stream(request, [job_id]), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/events")
+async def all_job_events(request: Request):
+    return StreamingResponse(progress_publisher.stream(request), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = scheduler.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "cancel_requested", "job_id": job.id}
+
+@app.post("/api/jobs/{job_id}/pause")
+async def pause_job(job_id: str):
+    job = scheduler.pause(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": job.status, "job_id": job.id}
+
+@app.post("/api/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    job = scheduler.resume(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": job.status, "job_id": job.id}
+
+class BatchRequest(BaseModel):
+    urls: list[str] = []
+    text: str = None # Contents of a dropped .txt/.csv file or a pasted list
+    download_dir: str = None
+    quality: str = "best"
+    audio_only: bool = False
+    download_playlist: bool = False
+    refresh_metadata: bool = False
+    force: bool = False
+    rate_limit: int = Field(None, ge=1)
+    weight: float = Field(1.0, gt=0)
+    priority: Literal["interactive", "bulk"] = None # Defaults to bulk
+
+@app.post("/api/jobs/batch")
+async def create_batch(request: BatchRequest):
+    urls, duplicates = parse_url_list(request.urls, request.text)
+    if not urls:
+        raise HTTPException(status_code=400, detail="No URLs found")
+    request.download_dir = checked_download_dir(request.download_dir)
+    base_request = DownloadRequest(url="", **request.model_dump(exclude={"urls", "text"}, exclude_none=True))
+    prune_ended()
+    batch = DownloadBatch(urls, duplicates)
+    batches[batch.id] = batch
+    threading.Thread(target=run_batch, args=(batch, base_request), name=f"batch-{batch.id}", daemon=True).start()
+    logger.info("Accepted batch %s with %s URLs (%s duplicates dropped)", batch.id, len(urls), duplicates)
+    return {"batch_id": batch.id, "accepted": len(urls), "duplicates": duplicates}
+
+@app.get("/api/batches")
+async def list_batches():
+    return {"batches": [batch.to_dict() for batch in batches.values()]}
+
+@app.get("/api/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch.to_dict()
+
+@app.post("/api/download")
+async def download_video(request: DownloadRequest):
+    """Blocking variant of /api/jobs kept for older clients."""
+    request.download_dir = checked_download_dir(request.download_dir)
+    job = scheduler.submit(request)
+    await anyio.to_thread.run_sync(job.done.wait)
+    if job.status == "error":
+        raise HTTPException(status_code=500, detail=job.error)
+    return job.result
+
+@app.get("/api/fragment_concurrency")
+async def get_fragment_concurrency():
+    return fragment_controller.snapshot()
+
+class BandwidthRequest(BaseModel):
+    limit: int = Field(None, ge=0) # bytes/s, None or 0 for unlimited
+    weight: float = Field(None, gt=0)
+
+@app.get("/api/bandwidth")
+async def get_bandwidth():
+    return bandwidth_manager.snapshot()
+
+@app.post("/api/bandwidth")
+async def set_bandwidth(request: BandwidthRequest):
+    # A body without "limit" leaves the cap as it is
+    if "limit" in request.model_fields_set:
+        bandwidth_manager.set_global_limit(request.limit or None)
+        save_config(bandwidth_limit=request.limit or 0)
+        logger.info("Global bandwidth limit set to %s", request.limit or 'unlimited')
+    return bandwidth_manager.snapshot()
+
+@app.post("/api/jobs/{job_id}/bandwidth")
+async def set_job_bandwidth(job_id: str, request: BandwidthRequest):
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if "limit" in request.model_fields_set:
+        job.request.rate_limit = request.limit or None
+    if request.weight is not None:
+        job.request.weight = request.weight
+    # Queued jobs pick the new values up when they start
+    bandwidth_manager.set_job_limit(job.id, job.request.rate_limit, request.weight)
+    return {"status": "ok", "job_id": job.id, "rate_limit": job.request.rate_limit, "weight": job.request.weight}
+
+@app.get("/api/pipeline")
+async def get_pipeline_stats():
+    return {"download": scheduler.stats(), "postprocess": postprocess_pipeline.stats()}
+
+queued_jobs = metrics_registry.gauge("videoindiren_queued_jobs", "Jobs waiting, by stage", ["stage"])
+active_jobs = metrics_registry.gauge("videoindiren_active_jobs", "Jobs being worked on, by stage", ["stage"])
+reserved_disk_space = metrics_registry.gauge(
+    "videoindiren_disk_reserved_bytes", "Disk space reserved by running downloads from their size estimates")
+log_records_dropped = metrics_registry.gauge(
+    "videoindiren_log_records_dropped", "Log records dropped because the log writer fell behind")
+paused_jobs = metrics_registry.gauge("videoindiren_paused_jobs", "Download jobs paused by preemption or by the user")
+bandwidth_limit = metrics_registry.gauge("videoindiren_bandwidth_limit_bytes", "Global bandwidth cap, 0 when unlimited")
+cache_lookups = metrics_registry.counter("videoindiren_metadata_cache_lookups_total", "Extraction cache lookups", ["result"])
+http_sessions = metrics_registry.counter("videoindiren_http_sessions_total", "Pooled HTTP session checkouts", ["result"])
+connection_reuse = metrics_registry.gauge(
+    "videoindiren_http_connection_reuse_ratio", "Share of HTTP requests sent over an already open connection")
+host_fragment_concurrency = metrics_registry.gauge(
+    "videoindiren_fragment_concurrency", "Current fragment concurrency per host", ["host"])
+
+def collect_live_metrics():
+    download, postprocess = scheduler.stats(), postprocess_pipeline.stats()
+    queued_jobs.set(download["queued"], stage="download")
+    queued_jobs.set(postprocess["queued"], stage="postprocess")
+    active_jobs.set(download["active"], stage="download")
+    active_jobs.set(postprocess["active"], stage="postprocess")
+    paused_jobs.set(download["paused"])
+    log_records_dropped.set(log_handler.dropped)
+    disk = disk_space_manager.stats()
+    reserved_disk_space.set(disk["reserved_bytes"])
+    bandwidth_limit.set(bandwidth_manager.global_limit or 0)
+    cache_lookups.set(extraction_cache.hits, result="hit")
+    cache_lookups.set(extraction_cache.misses, result="miss")
+    sessions = session_pool.stats()
+    http_sessions.set(sessions["created"], result="created")
+    http_sessions.set(sessions["reused"], result="reused")
+    if sessions["connection_reuse_rate"] is not None:
+        connection_reuse.set(sessions["connection_reuse_rate"])
+    host_fragment_concurrency.clear()
+    for host, state in fragment_controller.snapshot().items():
+        host_fragment_concurrency.set(state["concurrency"], host=host)
+
+metrics_registry.add_collector(collect_live_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/sessions")
+async def get_session_stats():
+    return session_pool.stats()
+
+@app.get("/api/disk")
+async def get_disk_stats():
+    return {**disk_space_manager.stats(), "download_dir": DOWNLOAD_DIR,
+            "free": shutil.disk_usage(DOWNLOAD_DIR).free if os.path.isdir(DOWNLOAD_DIR) else None}
+
+@app.get("/api/cache")
+async def get_cache_stats():
+    return extraction_cache.stats()
+
+@app.delete("/api/cache")
+async def clear_cache():
+    extraction_cache.clear()
+    return {"status": "ok"}
+
+@app.get("/api/resumable")
+async def list_resumable():
+    return {"jobs": download_journal.resumable()}
+
+@app.post("/api/resumable/{job_id}/resume")
+async def resume_journal_job(job_id: str):
+    entry = download_journal.get(job_id)
+    if entry is None or entry["state"] == "running":
+        raise HTTPException(status_code=404, detail="No resumable job with this id")
+    request = DownloadRequest(**entry["request"])
+    request.download_dir = checked_download_dir(request.download_dir)
+    request.force = True
+    # Pin the formats the fragments belong to, a new selection could pick different ones
+    if not request.format_id and not request.download_playlist and entry.get("format_id"):
+        request.format_id = entry["format_id"]
+    download_journal.remove(job_id)
+    job = scheduler.submit(request)
+    return {"job_id": job.id, "status": job.status}
+
+@app.delete("/api/resumable/{job_id}")
+async def abandon_job(job_id: str):
+    entry = download_journal.get(job_id)
+    if entry is None or entry["state"] == "running":
+        raise HTTPException(status_code=404, detail="No resumable job with this id")
+    await anyio.to_thread.run_sync(abandon_journaled_job, entry)
+    return {"status": "abandoned"}
+
+@app.get("/api/formats")
+async def get_formats(url: str, refresh: bool = False):
+    try:
+        return await anyio.to_thread.run_sync(probe_formats, url, refresh)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Format probe failed for %s: %s", url, e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/history")
+async def get_history(page: int = 1, page_size: int = 50, q: str = None):
+    return history_index.page(page, page_size, q)
+
+@app.delete("/api/history/{record_id}")
+async def delete_history_record(record_id: int):
+    if not history_index.delete(record_id):
+        raise HTTPException(status_code=404, detail="Record not found")
+    return {"status": "ok"}
+
 @app.get("/api/heartbeat")
 async def heartbeat():
     global last_heartbeat_time
@@ -344,7 +1865,8 @@ async def heartbeat():
 @app.get("/api/config")
 async def get_config():
     _, quality = load_config()
-    return {"default_dir": DOWNLOAD_DIR, "quality": quality}
+    return {"default_dir": DOWNLOAD_DIR, "quality": quality, "max_parallel_downloads": scheduler.max_workers,
+            "playlist_workers": PLAYLIST_WORKERS}
 
 class QualityRequest(BaseModel):
     quality: str
@@ -357,7 +1879,14 @@ async def set_quality(request: QualityRequest):
 @app.get("/api/select_folder")
 async def select_folder():
     global DOWNLOAD_DIR
-    root = tk.Tk()
+    require_desktop()
+    # Imported here so headless installs without a display or Tk can still run the server
+    try:
+        import tkinter as tk
+        from tkinter import filedialog
+        root = tk.Tk()
+    except Exception as e:
+        raise HTTPException(status_code=501, detail=f"Folder picker is not available: {e}")
     root.withdraw()
     # Ensure dialog is on top
     root.attributes('-topmost', True)
@@ -373,6 +1902,7 @@ class OpenFolderRequest(BaseModel):
 
 @app.post("/api/open_folder")
 async def open_folder(request: OpenFolderRequest):
+    require_desktop()
     try:
         path = os.path.normpath(request.file_path)
         if os.path.exists(path):
@@ -388,7 +1918,7 @@ async def open_folder(request: OpenFolderRequest):
         else:
             return {"status": "error", "message": "File not found"}
     except Exception as e:
-        logger.error(f"Failed to open folder: {e}")
+        logger.error("Failed to open folder: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.get("/")
@@ -398,50 +1928,85 @@ async def read_root():
 
 
 # --- 3. Desktop Application Launcher ---
-def start_server():
+def call_when_started(server, callback):
+    """Runs callback once uvicorn is accepting connections."""
+    while not server.started:
+        if server.should_exit:
+            return
+        time.sleep(0.05)
+    callback()
+
+def start_server(host="127.0.0.1", port=4321, on_started=None):
     """Starts the Uvicorn server."""
+    import uvicorn
     try:
-        config = uvicorn.Config(app, host="127.0.0.1", port=4321, log_level="info")
+        config = uvicorn.Config(app, host=host, port=port, log_level="info")
         server = uvicorn.Server(config)
+        if on_started:
+            threading.Thread(target=call_when_started, args=(server, on_started), name="on-started", daemon=True).start()
         server.run()
     except Exception as e:
-        logger.error(f"Uvicorn failed to start: {e}")
+        logger.error("Uvicorn failed to start: %s", e)
+
+def remove_file_with_retry(file_path):
+    """Deletes a file, retrying while Windows still holds a lock on it."""
+    for attempt in range(5):
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                if not os.path.exists(file_path):
+                    logger.info("Successfully deleted: %s", os.path.basename(file_path))
+                    return True
+                else:
+                    raise Exception("File still exists")
+            return False
+        except:
+            if attempt < 4:
+                time.sleep(0.5)
+    return False
+
+def delete_paths(paths):
+    """Deletes the given paths in parallel and returns the ones that could not be removed."""
+    paths = [p for p in dict.fromkeys(paths) if os.path.lexists(p)]
+    if paths:
+        with ThreadPoolExecutor(max_workers=min(8, len(paths)), thread_name_prefix="cleanup") as pool:
+            list(pool.map(remove_file_with_retry, paths))
+    return [p for p in paths if os.path.lexists(p)]
+
+def cleanup_job_files(job):
+    """Delete the temporary files of a single job, leaving other jobs untouched."""
+    paths = list(job.files) + resume_journal.manifest_paths(job.temp_paths, job.fragments)
+    download_journal.add_orphans(delete_paths(paths))
+    job.files.clear()
+
+def abandon_journaled_job(entry):
+    """Deletes the partial files of a journaled job that will not be resumed."""
+    download_journal.add_orphans(delete_paths(resume_journal.entry_paths(entry)))
+    download_journal.remove(entry["job_id"])
 
 def cleanup_interrupted_downloads():
-    """Delete leftover temporary files aggressively."""
+    """Deletes temp files earlier cleanups could not remove, e.g. because they were still locked.
+
+    Only paths from job manifests are touched; partial files of journaled
+    jobs stay for resume and nothing else in the download folder is searched.
+    """
     try:
-        # Search in the main download directory and its subfolders
-        if os.path.exists(DOWNLOAD_DIR):
-            logger.info(f"Aggressively cleaning up temporary files in {DOWNLOAD_DIR}...")
-            
-            # Forcefully stop any merging processes to release file locks on Windows
-            if sys.platform == "win32":
-                try:
-                    import subprocess
-                    subprocess.run(['taskkill', '/F', '/IM', 'ffmpeg.exe', '/T'], capture_output=True, check=False)
-                    time.sleep(1) # Wait for OS to settle
-                except:
-                    pass
-
-            for root, dirs, files in os.walk(DOWNLOAD_DIR):
-                for file in files:
-                    if any(ext in file.lower() for ext in ('.part', '.ytdl', '.temp', '.tmp', '.part-frag')):
-                        file_path = os.path.join(root, file)
-                        # Deletion loop to ensure lock release
-                        for attempt in range(5):
-                            try:
-                                if os.path.exists(file_path):
-                                    os.remove(file_path)
-                                    if not os.path.exists(file_path):
-                                        logger.info(f"Successfully deleted: {file}")
-                                        break
-                                    else:
-                                        raise Exception("File still exists")
-                            except:
-                                if attempt < 4:
-                                    time.sleep(0.5)
+        orphans = download_journal.get_orphans()
+        if not orphans:
+            return
+        logger.info("Cleaning up %s leftover temporary files...", len(orphans))
+
+        # Forcefully stop any merging processes to release file locks on Windows
+        if sys.platform == "win32":
+            try:
+                subprocess.run(['taskkill', '/F', '/IM', 'ffmpeg.exe', '/T'], capture_output=True, check=False)
+                time.sleep(1) # Wait for OS to settle
+            except:
+                pass
+
+        download_journal.set_orphans(delete_paths(orphans))
     except Exception as e:
-        logger.error(f"Aggressive cleanup failed: {e}")
+        logger.error("Leftover cleanup failed: %s", e)
 
 def monitor_heartbeat():
     """Monitors heartbeats and shuts down the process if none are received."""
@@ -450,10 +2015,10 @@ def monitor_heartbeat():
         time.sleep(2)
         if time.time() - last_heartbeat_time > 10:
             logger.info("No heartbeat received for 10 seconds. Shutting down...")
-            global cancel_requested
-            cancel_requested = True
+            scheduler.interrupt_all()
             time.sleep(3) 
             cleanup_interrupted_downloads()
+            app_logging.stop_logging()
             os._exit(0)
             break
 
@@ -466,7 +2031,7 @@ def check_ffmpeg():
     # 2. Check for AppData 'ffmpeg/bin' folder
     appdata_ffmpeg_bin = os.path.join(FFMPEG_DIR, "bin")
     if os.path.exists(appdata_ffmpeg_bin):
-        logger.info(f"Found FFmpeg in AppData: {appdata_ffmpeg_bin}. Adding to PATH...")
+        logger.info("Found FFmpeg in AppData: %s. Adding to PATH...", appdata_ffmpeg_bin)
         os.environ["PATH"] += os.pathsep + appdata_ffmpeg_bin
         if shutil.which("ffmpeg"):
              logger.info("FFmpeg successfully added to PATH from AppData.")
@@ -481,10 +2046,13 @@ def check_ffmpeg():
         except:
             pass
 
-    # 4. Auto-download to AppData
+    # 4. Auto-download to AppData, the bundled build is Windows-only
+    if sys.platform != "win32":
+        logger.warning("FFmpeg NOT found! Install it with the system package manager for merging and audio extraction.")
+        return
     logger.info("FFmpeg NOT found! Attempting automatic download to AppData...")
-    print("FFmpeg not found. Downloading dependencies to AppData, please wait...")
     try:
+        import setup_ffmpeg
         setup_ffmpeg.download_ffmpeg(FFMPEG_DIR)
         # Verify again after download
         if os.path.exists(appdata_ffmpeg_bin):
@@ -493,7 +2061,7 @@ def check_ffmpeg():
                  logger.info("FFmpeg successfully installed to AppData and added to PATH.")
                  return
     except Exception as e:
-        logger.error(f"Automatic FFmpeg download failed: {e}")
+        logger.error("Automatic FFmpeg download failed: %s", e)
 
     logger.warning("FFmpeg NOT found! Video merging will fail or result in lower quality/no audio.")
 
@@ -515,11 +2083,11 @@ def open_browser_app(url):
     
     if edge_exe:
         try:
-            logger.info(f"Found Edge at: {edge_exe}")
+            logger.info("Found Edge at: %s", edge_exe)
             subprocess.Popen([edge_exe, f"--app={url}"])
             return True
         except Exception as e:
-            logger.error(f"Failed to launch Edge exe: {e}")
+            logger.error("Failed to launch Edge exe: %s", e)
     
     # Try generic 'start' command for Edge App Mode fallback
     try:
@@ -533,33 +2101,72 @@ def open_browser_app(url):
         webbrowser.open(url)
         return True
     except Exception as e:
-        logger.error(f"All browser launch attempts failed: {e}")
+        logger.error("All browser launch attempts failed: %s", e)
         return False
 
+def run_startup_tasks():
+    """Startup work that runs once the server is already listening."""
+    started = time.perf_counter()
+    try:
+        check_ffmpeg()
+        # Startup Sweep: Clean any leftovers from previous crashed sessions
+        cleanup_interrupted_downloads()
+    except Exception as e:
+        logger.error("Startup task failed: %s", e)
+    finally:
+        startup_done.set()
+    # Warm the heavy imports so the first job does not pay for them
+    downloader_classes()
+    metadata_cache.url_to_video_key("https://example.com/")
+    logger.info("Background startup tasks finished in %.2fs", time.perf_counter() - started)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Video İndiren")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run as a long-lived service: no browser window, no heartbeat shutdown")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=4321, help="Port to bind (default: 4321)")
+    return parser.parse_args()
+
+def run_headless(host, port):
+    """Daemon mode for servers: the same engine, driven over the API or cli.py."""
+    global HEADLESS
+    HEADLESS = True
+    logger.info("Starting headless server on %s:%s", host, port)
+    try:
+        start_server(host, port, on_started=run_startup_tasks)
+    finally:
+        # Running jobs stay in the journal and can be resumed after a restart
+        scheduler.interrupt_all()
+
 if __name__ == '__main__':
     multiprocessing.freeze_support()
-    check_ffmpeg()
-    
-    # Startup Sweep: Clean any leftovers from previous crashed sessions
-    cleanup_interrupted_downloads()
+    args = parse_args()
+    # The server binds first; FFmpeg check and sweep follow in the background
+    startup_done.clear()
+
+    if args.headless:
+        run_headless(args.host, args.port)
+        sys.exit(0)
     
-    # Launch browser after a slight delay to ensure server is starting
+    # The browser is launched once the server is listening
     try:
-        url = "http://127.0.0.1:4321"
-        logger.info(f"Opening browser at {url}")
+        url = f"http://127.0.0.1:{args.port}"
+        logger.info("Opening browser at %s", url)
         
         # Start monitoring thread
         monitor_thread = threading.Thread(target=monitor_heartbeat, daemon=True)
         monitor_thread.start()
         
-        # Launch browser
-        open_browser_app(url)
-        
+        def on_started():
+            # The page is served by now, the window never opens onto a dead page
+            open_browser_app(url)
+            run_startup_tasks()
+
         # Start server in main thread (blocking)
-        start_server()
+        start_server(args.host, args.port, on_started)
             
     except KeyboardInterrupt:
         pass
     except Exception as e:
-        logger.error(f"Startup error: {e}")
-        print(f"Error: {e}")
+        logger.exception("Startup error: %s", e)
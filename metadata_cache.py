@@ -0,0 +1,165 @@
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that never change what a URL points to
+TRACKING_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+                   'si', 'feature', 'fbclid', 'gclid', 'pp', 'ab_channel')
+
+# Signed stream URLs must not be reused this close to their expiry
+EXPIRY_MARGIN = 300
+
+def normalize_url(url):
+    """Canonical form of a URL: lowercase scheme/host, no fragment, no tracking params, sorted query."""
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in TRACKING_PARAMS and not k.lower().startswith('utm_'))
+    netloc = parts.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower() or 'https', netloc, path, urlencode(query), ''))
+
+_extractor_classes = None
+
+def url_to_video_key(url):
+    """Resolves a URL to "<extractor>:<video id>" without any network access.
+
+    Returns None for URLs only the generic extractor would handle, since
+    their id is not stable.
+    """
+    global _extractor_classes
+    if _extractor_classes is None:
+        from yt_dlp.extractor import gen_extractor_classes
+        _extractor_classes = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+    for ie in _extractor_classes:
+        try:
+            if ie.suitable(url):
+                video_id = ie.get_temp_id(url)
+                return f"{ie.ie_key()}:{video_id}" if video_id else None
+        except Exception:
+            continue
+    return None
+
+def stream_expiry(info):
+    """Earliest expiry timestamp among the signed format URLs of an info dict."""
+    expiries = []
+    for fmt in info.get('formats') or []:
+        for key, value in parse_qsl(urlsplit(fmt.get('url') or '').query):
+            if key in ('expire', 'Expires') and value.isdigit():
+                expiries.append(int(value))
+    return min(expiries) if expiries else None
+
+class MetadataCache:
+    """On-disk cache of yt-dlp info dicts with TTL expiry and size-bounded LRU eviction.
+
+    Entries are stored zlib-compressed in SQLite and keyed by namespace plus
+    normalized URL; an alias row keyed by "<extractor>:<video id>" lets
+    different URLs of the same video hit the same entry.
+    """
+
+    def __init__(self, path, ttl=3600, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, key TEXT NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+
+    def _resolve_keys(self, url, namespace):
+        keys = [f"{namespace}:{normalize_url(url)}"]
+        video_key = url_to_video_key(url) if namespace == 'video' else None
+        if video_key:
+            keys.append(video_key)
+        return keys
+
+    def get(self, url, namespace='video'):
+        now = time.time()
+        keys = self._resolve_keys(url, namespace)
+        with self.lock:
+            row = self.conn.execute("SELECT key, data, expires_at FROM entries WHERE key = ?", (keys[0],)).fetchone()
+            if row is None and len(keys) > 1:
+                row = self.conn.execute(
+                    "SELECT e.key, e.data, e.expires_at FROM aliases a JOIN entries e ON e.key = a.key WHERE a.alias = ?",
+                    (keys[1],)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            key, data, expires_at = row
+            with self.conn:
+                if expires_at <= now:
+                    self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self.misses += 1
+                    return None
+                self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(zlib.decompress(data))
+
+    def put(self, url, info, ttl=None, namespace='video'):
+        now = time.time()
+        expires_at = now + (ttl or self.ttl)
+        signed_expiry = stream_expiry(info)
+        if signed_expiry:
+            expires_at = min(expires_at, signed_expiry - EXPIRY_MARGIN)
+        if expires_at <= now:
+            return
+        data = zlib.compress(json.dumps(info).encode('utf-8'))
+        keys = self._resolve_keys(url, namespace)
+        if namespace == 'video' and info.get('extractor_key') and info.get('id'):
+            keys.append(f"{info['extractor_key']}:{info['id']}")
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, data, size, created_at, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (keys[0], data, len(data), now, expires_at, now))
+            for alias in keys[1:]:
+                self.conn.execute("INSERT OR REPLACE INTO aliases (alias, key) VALUES (?, ?)", (alias, keys[0]))
+            self._evict(now)
+
+    def invalidate(self, url, namespace='video'):
+        keys = self._resolve_keys(url, namespace)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (keys[0],))
+            for alias in keys[1:]:
+                self.conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM aliases WHERE alias = ?)", (alias,))
+
+    def _evict(self, now):
+        """Drops expired rows, then least recently used rows until under max_bytes. Caller holds the lock."""
+        self.conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            evicted = 0
+            for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+            logger.info("Metadata cache evicted %s entries to stay under %s bytes", evicted, self.max_bytes)
+        self.conn.execute("DELETE FROM aliases WHERE key NOT IN (SELECT key FROM entries)")
+
+    def stats(self):
+        with self.lock:
+            count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM aliases")
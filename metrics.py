@@ -0,0 +1,111 @@
+import math
+import threading
+
+# Seconds; wide enough for both a cached 50 ms extraction and an hour-long download
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Bytes per second, from dial-up speeds to a saturated gigabit link
+THROUGHPUT_BUCKETS = (64e3, 256e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6, 100e6)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """One metric family in the Prometheus text exposition format."""
+
+    def __init__(self, name, kind, help_text, labels=(), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets or DEFAULT_BUCKETS) + (math.inf,) if kind == "histogram" else None
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def inc(self, amount=1, **labels):
+        with self.lock:
+            key = self._key(labels)
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def observe(self, value, **labels):
+        with self.lock:
+            key = self._key(labels)
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+                continue
+            for bound, count in zip(self.buckets, value["buckets"]):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(value['sum'])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {value['count']}")
+        return lines
+
+class MetricsRegistry:
+    """Minimal metrics registry, so /metrics needs no extra dependency.
+
+    Collectors registered with add_collector() run before every scrape to
+    refresh gauges that mirror state owned by other components.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Metric(name, "counter", help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Metric(name, "gauge", help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=None):
+        return self._add(Metric(name, "histogram", help_text, labels, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,53 @@
+import os
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class PostProcessingPipeline:
+    """Bounded stage that runs yt-dlp post-processing (merging, audio extraction, moves) off the download workers.
+
+    The heavy lifting happens in ffmpeg child processes, so each pool thread
+    just drives one of them; the pool size bounds how many ffmpeg processes
+    run at once and defaults to the number of cores.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess")
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, func, *args):
+        """Queues func(*args) and returns its Future."""
+        with self.lock:
+            self.queued += 1
+
+        def run():
+            with self.lock:
+                self.queued -= 1
+                self.active += 1
+            try:
+                return func(*args)
+            except Exception as e:
+                logger.error("Post-processing failed: %s", e)
+                with self.lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self.lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        # Runs in the caller's context, so its logs keep the caller's job id
+        return self.executor.submit(contextvars.copy_context().run, run)
+
+    def stats(self):
+        with self.lock:
+            return {"workers": self.workers, "queued": self.queued, "active": self.active,
+                    "completed": self.completed, "failed": self.failed}
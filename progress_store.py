@@ -0,0 +1,55 @@
+def format_bytes(b):
+    if b is None or b == 0: return "0.0B"
+    # Using 1024 as yt-dlp uses binary prefixes for sizes
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(b) < 1024.0:
+            return f"{b:3.1f}{unit}"
+        b /= 1024.0
+    return f"{b:.1f}TB"
+
+class ProgressRecord:
+    """Progress of one job as plain numbers, turned into display text only by to_dict().
+
+    Records are never changed in place: replace() returns a new one and the
+    job swaps its reference, which is atomic, so a reader on the event loop
+    always sees a whole record while yt-dlp threads keep updating.
+    """
+
+    __slots__ = ("status", "percent", "speed", "downloaded", "total", "unit",
+                 "playlist_index", "playlist_count", "active_entries")
+
+    def __init__(self, status="queued", percent=0.0, speed=0, downloaded=0, total=0, unit="bytes",
+                 playlist_index=None, playlist_count=None, active_entries=()):
+        self.status = status
+        self.percent = percent # 0-100, None when the total size is unknown
+        self.speed = speed # bytes/s, None when it does not apply (e.g. while merging)
+        self.downloaded = downloaded # Bytes, or finished entries when unit is "video"
+        self.total = total
+        self.unit = unit
+        self.playlist_index = playlist_index
+        self.playlist_count = playlist_count
+        self.active_entries = active_entries # (index, title, percent, status) of running playlist entries
+
+    def replace(self, **fields):
+        record = ProgressRecord.__new__(ProgressRecord)
+        for name in self.__slots__:
+            setattr(record, name, fields.pop(name) if name in fields else getattr(self, name))
+        if fields:
+            raise TypeError(f"Unknown progress fields: {', '.join(fields)}")
+        return record
+
+    def to_dict(self):
+        progress = {
+            "percent": f"{self.percent:.1f}%" if self.percent is not None else "N/A",
+            "speed": f"{format_bytes(self.speed)}/s" if self.speed is not None else "N/A",
+            "status": self.status,
+            "playlist_info": f"{self.playlist_index} / {self.playlist_count}"
+                             if self.playlist_index is not None and self.playlist_count is not None else "",
+        }
+        if self.unit == "video":
+            progress["size_info"] = f"{self.downloaded} / {self.total} video"
+            progress["active_entries"] = [{"index": index, "title": title, "percent": f"{percent:.1f}%", "status": status}
+                                          for index, title, percent, status in self.active_entries]
+        elif self.downloaded or self.total:
+            progress["size_info"] = f"{format_bytes(self.downloaded)} / {format_bytes(self.total)}"
+        return progress
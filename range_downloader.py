@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import time
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Bytes read from a connection per write into the file
+CHUNK_SIZE = 256 * 1024
+
+# No range is made smaller than this, so small files keep fewer connections
+MIN_PART_SIZE = 4 * 1024 * 1024
+
+class RangeNotSupported(Exception):
+    pass
+
+def split_ranges(size, connections, min_part=MIN_PART_SIZE):
+    """Splits size bytes into at most `connections` inclusive [start, end] ranges of similar length."""
+    count = max(1, min(connections, size // min_part))
+    step = -(-size // count)
+    return [[start, min(start + step, size) - 1] for start in range(0, size, step)]
+
+def load_state(state_path, size):
+    """Per-range progress saved by an interrupted download of the same size, or None."""
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        if state.get("size") == size and state.get("ranges"):
+            return state["ranges"]
+    except (OSError, ValueError):
+        pass
+    return None
+
+def save_state(state_path, size, ranges):
+    tmp = f"{state_path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"size": size, "ranges": ranges}, f)
+    os.replace(tmp, state_path)
+
+def preallocate(path, size):
+    """Creates path with its final size up front, so every range can be written at its offset."""
+    with open(path, 'wb') as f:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+
+def download_ranges(open_range, path, size, connections=4, progress=None, state_path=None, retries=10):
+    """Downloads size bytes into path over several connections, each writing its own byte range in place.
+
+    open_range(start, end) returns a readable response for the inclusive
+    byte range and raises RangeNotSupported when the server ignores it.
+    Failed ranges are retried from where they stopped. progress(downloaded)
+    is called after every chunk, serialized, and may raise to abort. With a
+    state_path the per-range progress is saved so an interrupted download
+    continues where each range stopped. Returns the bytes fetched now.
+    """
+    ranges = load_state(state_path, size) if state_path else None
+    if ranges is None or not os.path.exists(path) or os.path.getsize(path) != size:
+        ranges = [[start, end, 0] for start, end in split_ranges(size, connections)]
+        preallocate(path, size)
+    resumed = sum(done for _, _, done in ranges)
+    downloaded = resumed
+    lock = threading.Lock()
+    stop = threading.Event()
+    last_save = time.monotonic()
+
+    def fetch(part):
+        nonlocal downloaded, last_save
+        start, end, _ = part
+        attempts = 0
+        with open(path, 'r+b', buffering=0) as f:
+            while start + part[2] <= end and not stop.is_set():
+                offset = start + part[2]
+                try:
+                    response = open_range(offset, end)
+                    try:
+                        f.seek(offset)
+                        while not stop.is_set() and start + part[2] <= end:
+                            chunk = response.read(min(CHUNK_SIZE, end + 1 - start - part[2]))
+                            if not chunk:
+                                raise IOError(f"Connection closed at byte {start + part[2]} of range {start}-{end}")
+                            f.write(chunk)
+                            attempts = 0
+                            with lock:
+                                part[2] += len(chunk)
+                                downloaded += len(chunk)
+                                if state_path and time.monotonic() - last_save > 1:
+                                    save_state(state_path, size, ranges)
+                                    last_save = time.monotonic()
+                                if progress:
+                                    try:
+                                        progress(downloaded)
+                                    except BaseException:
+                                        stop.set() # Aborted by the caller, not a network error to retry
+                                        raise
+                    finally:
+                        response.close()
+                except RangeNotSupported:
+                    raise
+                except Exception:
+                    if stop.is_set() or attempts >= retries:
+                        raise
+                    attempts += 1
+                    time.sleep(min(attempts, 5))
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="range") as pool:
+            futures = [pool.submit(fetch, part) for part in ranges if part[0] + part[2] <= part[1]]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+    finally:
+        if state_path:
+            with lock:
+                save_state(state_path, size, ranges)
+
+    written = sum(done for _, _, done in ranges)
+    if written != size or os.path.getsize(path) != size:
+        raise IOError(f"Range download incomplete: {written} of {size} bytes")
+    if state_path:
+        os.remove(state_path)
+    return downloaded - resumed
+
+@functools.lru_cache(maxsize=None)
+def range_fd_class():
+    """yt-dlp downloader that splits large progressive files into ranges; falls back to HttpFD otherwise.
+
+    Reads 'range_connections' and 'range_min_size' from the YoutubeDL params.
+    Built on first use so yt_dlp is only imported by the first download.
+    """
+    from yt_dlp.downloader.http import HttpFD
+    from yt_dlp.networking import Request
+
+    class RangeSplitFD(HttpFD):
+        def _request(self, info_dict, start, end):
+            headers = {**(info_dict.get('http_headers') or {}), 'Range': f'bytes={start}-{end}'}
+            return self.ydl.urlopen(Request(info_dict['url'], headers=headers))
+
+        def probe_size(self, info_dict):
+            """Total size when the server honours range requests, else None."""
+            try:
+                with self._request(info_dict, 0, 0) as response:
+                    match = re.match(r'bytes 0-0/(\d+)', response.headers.get('Content-Range') or '')
+                    return int(match.group(1)) if response.status == 206 and match else None
+            except Exception:
+                return None
+
+        def real_download(self, filename, info_dict):
+            tmpfilename = self.temp_name(filename)
+            state_path = self.ytdl_filename(filename)
+            connections = self.params.get('range_connections') or 1
+            min_size = self.params.get('range_min_size', 0)
+            # A size the extractor already reports spares small files the probe round trip
+            known_size = info_dict.get('filesize') or info_dict.get('filesize_approx')
+            probe = connections > 1 and not (known_size and known_size < min_size)
+            size = self.probe_size(info_dict) if probe else None
+            if not size or size < min_size or (
+                    os.path.exists(tmpfilename) and not os.path.exists(state_path)):
+                # Also leaves a partial file of a plain download to HttpFD's own resume
+                if os.path.exists(state_path):
+                    # A preallocated file would look complete to HttpFD
+                    for path in (tmpfilename, state_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+                return super().real_download(filename, info_dict)
+
+            def open_range(start, end):
+                response = self._request(info_dict, start, end)
+                if response.status != 206 or not (response.headers.get('Content-Range') or '').startswith(f'bytes {start}-'):
+                    response.close()
+                    raise RangeNotSupported(f"Server ignored the range {start}-{end}")
+                return response
+
+            started = time.time()
+            n_ranges = len(split_ranges(size, connections))
+            saved = load_state(state_path, size) if os.path.exists(tmpfilename) else None
+            resumed = sum(done for _, _, done in saved or [])
+            if resumed:
+                self.report_resuming_byte(resumed)
+
+            def progress(downloaded):
+                now = time.time()
+                self._hook_progress({
+                    'status': 'downloading',
+                    'downloaded_bytes': downloaded,
+                    'total_bytes': size,
+                    'filename': filename,
+                    'tmpfilename': tmpfilename,
+                    'elapsed': now - started,
+                    'speed': self.calc_speed(started, now, downloaded - resumed),
+                    'range_count': n_ranges,
+                    'allocated_bytes': size, # The whole .part is preallocated
+                }, info_dict)
+
+            self.report_destination(filename)
+            self.to_screen(f'[download] Fetching {size} bytes over {n_ranges} connections')
+            download_ranges(open_range, tmpfilename, size, connections, progress, state_path,
+                            retries=self.params.get('retries', 10))
+            self.try_rename(tmpfilename, filename)
+            self._hook_progress({
+                'status': 'finished',
+                'downloaded_bytes': size,
+                'total_bytes': size,
+                'filename': filename,
+                'elapsed': time.time() - started,
+            }, info_dict)
+            return True
+
+    return RangeSplitFD
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def manifest_paths(temp_paths, fragments):
+    """Every path a job's manifest covers, fragments expanded from their count.
+
+    Fragment files are named "<tmpfilename>-Frag<n>", with a ".part" of their
+    own while they download; recording the count instead of each name keeps
+    the journal small for streams with thousands of fragments.
+    """
+    paths = list(temp_paths)
+    for tmpfilename, count in fragments.items():
+        for index in range(1, count + 1):
+            paths.append(f"{tmpfilename}-Frag{index}")
+            paths.append(f"{tmpfilename}-Frag{index}.part")
+    return paths
+
+def partial_size(path):
+    """Bytes already fetched into path. A range-split download preallocates its
+    .part file, so the per-range progress in its .ytdl state counts instead."""
+    if path.endswith(".part"):
+        try:
+            with open(f"{path[:-len('.part')]}.ytdl", 'r') as f:
+                ranges = json.load(f).get("ranges")
+            if ranges:
+                return sum(done for _, _, done in ranges)
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+    return os.path.getsize(path)
+
+def entry_paths(entry):
+    return manifest_paths(entry.get("temp_paths", []), entry.get("fragments", {}))
+
+class ResumeJournal:
+    """JSON journal of unfinished downloads, so their partial files survive a restart.
+
+    A job is written when it starts and removed once it finishes or is
+    explicitly abandoned. Whatever is left on startup was interrupted and
+    can be resumed from its .part/.ytdl fragments.
+
+    Each job also carries the manifest of every temporary path it created,
+    so cleanup deletes exactly those. Paths that could not be deleted (a
+    file still locked on Windows) are kept as orphans for the next startup.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.orphans = []
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if "jobs" in data:
+                    self.jobs, self.orphans = data["jobs"], data.get("orphans", [])
+                else:
+                    self.jobs = data # Journal of an older version: jobs only
+        except Exception as e:
+            logger.error("Failed to load download journal: %s", e)
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"jobs": self.jobs, "orphans": self.orphans}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error("Failed to save download journal: %s", e)
+
+    def start(self, job_id, url, request, download_dir):
+        with self.lock:
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "url": url,
+                "request": request,
+                "download_dir": download_dir,
+                "format_id": None, # Complete selection, e.g. "137+140", pinned on resume
+                "files": [],
+                "temp_paths": [],
+                "fragments": {},
+                "state": "running",
+                "created_at": time.time(),
+                "updated_at": time.time(),
+            }
+            self._save()
+
+    def add_file(self, job_id, filename):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry is None:
+                return
+            if filename not in entry["files"]:
+                entry["files"].append(filename)
+            entry["updated_at"] = time.time()
+            self._save()
+
+    def set_format(self, job_id, format_id):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry is None or entry.get("format_id") == format_id:
+                return
+            entry["format_id"] = format_id
+            self._save()
+
+    def add_temp_path(self, job_id, path):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry is None:
+                return
+            temp_paths = entry.setdefault("temp_paths", [])
+            if path not in temp_paths:
+                temp_paths.append(path)
+                self._save()
+
+    def add_fragments(self, job_id, tmpfilename, count):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry is None:
+                return
+            fragments = entry.setdefault("fragments", {})
+            if fragments.get(tmpfilename, 0) < count:
+                fragments[tmpfilename] = count
+                self._save()
+
+    def mark(self, job_id, state):
+        with self.lock:
+            if job_id in self.jobs:
+                self.jobs[job_id]["state"] = state
+                self.jobs[job_id]["updated_at"] = time.time()
+                self._save()
+
+    def mark_all_interrupted(self):
+        """Called at startup: nothing can still be running from a previous session."""
+        with self.lock:
+            for entry in self.jobs.values():
+                if entry["state"] == "running":
+                    entry["state"] = "interrupted"
+            self._save()
+
+    def remove(self, job_id):
+        with self.lock:
+            entry = self.jobs.pop(job_id, None)
+            if entry is not None:
+                self._save()
+            return entry
+
+    def get(self, job_id):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            return dict(entry) if entry else None
+
+    def entries(self):
+        with self.lock:
+            return [dict(entry) for entry in self.jobs.values()]
+
+    def resumable(self):
+        """Interrupted jobs with the number of partial bytes already on disk."""
+        items = []
+        for entry in self.entries():
+            if entry["state"] == "running":
+                continue
+            entry["partial_bytes"] = sum(partial_size(p) for p in entry_paths(entry) if os.path.isfile(p))
+            items.append(entry)
+        return items
+
+    def set_orphans(self, paths):
+        """Replaces the list of paths still waiting to be deleted."""
+        with self.lock:
+            self.orphans = sorted(set(paths))
+            self._save()
+
+    def add_orphans(self, paths):
+        if paths:
+            with self.lock:
+                self.orphans = sorted(set(self.orphans) | set(paths))
+                self._save()
+
+    def get_orphans(self):
+        with self.lock:
+            return list(self.orphans)
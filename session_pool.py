@@ -0,0 +1,143 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# YoutubeDL params that shape its HTTP session; jobs only share a session when all of them match
+NETWORK_PARAMS = (
+    "http_headers", "proxy", "nocheckcertificate", "source_address", "socket_timeout",
+    "legacyserverconnect", "impersonate", "compat_opts", "cookiefile", "cookiesfrombrowser",
+    "client_certificate", "client_certificate_key", "client_certificate_password", "enable_file_urls",
+)
+
+def network_key(params):
+    return repr([(name, sorted(value.items()) if isinstance(value, dict) else value)
+                 for name, value in ((name, params.get(name)) for name in NETWORK_PARAMS)])
+
+def connection_counts(director):
+    """(new connections, requests) made through yt-dlp's requests handler, None for handlers without keep-alive."""
+    handler = director.handlers.get("Requests")
+    if handler is None:
+        return None
+    connections = requests = 0
+    for _, session in getattr(handler, "_InstanceStoreMixin__instances", []):
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                connections += getattr(pool, "num_connections", 0)
+                requests += getattr(pool, "num_requests", 0)
+    return connections, requests
+
+class PooledSession:
+    __slots__ = ("owner", "director", "cookiejar", "leases", "uses", "last_used")
+
+    def __init__(self, owner):
+        self.owner = owner # Bare YoutubeDL that built the director, also its logger
+        self.director = owner._request_director
+        self.cookiejar = owner.cookiejar
+        self.leases = 0
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+class SessionPool:
+    """Long-lived yt-dlp HTTP sessions (request director and cookie jar), one per site.
+
+    Every YoutubeDL a job creates borrows the session of its site instead
+    of building its own, so keep-alive connections, TLS sessions and
+    cookies carry over from one job to the next. Sessions idle for longer
+    than idle_timeout are closed. Keep-alive needs yt-dlp's `requests`
+    handler; with only urllib available the sharing still saves the setup
+    but every request opens a new connection.
+    """
+
+    def __init__(self, idle_timeout=300):
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.closed_connections = 0 # Counts of sessions that were already closed
+        self.closed_requests = 0
+
+    def _build(self, params):
+        import yt_dlp
+        owner = yt_dlp.YoutubeDL({**{name: params[name] for name in NETWORK_PARAMS if params.get(name) is not None},
+                                  "quiet": True, "no_warnings": True})
+        session = PooledSession(owner)
+        if "Requests" not in session.director.handlers:
+            logger.info("HTTP keep-alive is unavailable without the requests package, connections are not reused")
+        return session
+
+    def attach(self, ydl, site):
+        """Points a YoutubeDL at the shared session of its site; undo with release() before closing it."""
+        key = (site, network_key(ydl.params))
+        with self.lock:
+            self._close_idle()
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.sessions[key] = self._build(ydl.params)
+                self.created += 1
+            else:
+                self.reused += 1
+            session.leases += 1
+            session.uses += 1
+            session.last_used = time.monotonic()
+        own = ydl.__dict__.get("_request_director")
+        if own is not None and own is not session.director:
+            own.close()
+        # Both are cached properties, so the instance attributes take their place
+        ydl.__dict__["_request_director"] = session.director
+        ydl.__dict__["cookiejar"] = session.cookiejar
+        ydl._pooled_session = session
+
+    def release(self, ydl):
+        session = getattr(ydl, "_pooled_session", None)
+        if session is None:
+            return
+        # Keep YoutubeDL.close() from closing the shared director
+        ydl.__dict__.pop("_request_director", None)
+        ydl._pooled_session = None
+        with self.lock:
+            session.leases -= 1
+            session.last_used = time.monotonic()
+
+    def _close_idle(self):
+        """Closes sessions nobody borrowed for idle_timeout seconds. Caller holds the lock."""
+        now = time.monotonic()
+        for key, session in list(self.sessions.items()):
+            if session.leases == 0 and now - session.last_used > self.idle_timeout:
+                counts = connection_counts(session.director)
+                if counts:
+                    self.closed_connections += counts[0]
+                    self.closed_requests += counts[1]
+                del self.sessions[key]
+                session.owner.close()
+
+    def stats(self):
+        with self.lock:
+            self._close_idle()
+            connections, requests = self.closed_connections, self.closed_requests
+            sites = {}
+            for (site, _), session in self.sessions.items():
+                counts = connection_counts(session.director)
+                if counts:
+                    connections += counts[0]
+                    requests += counts[1]
+                sites.setdefault(site, {"sessions": 0, "uses": 0, "leases": 0})
+                sites[site]["sessions"] += 1
+                sites[site]["uses"] += session.uses
+                sites[site]["leases"] += session.leases
+            checkouts = self.created + self.reused
+            return {
+                "sessions": len(self.sessions),
+                "created": self.created,
+                "reused": self.reused,
+                "session_reuse_rate": round(self.reused / checkouts, 3) if checkouts else None,
+                "requests": requests,
+                "connections": connections,
+                # Share of requests sent over an already open connection
+                "connection_reuse_rate": round(1 - connections / requests, 3) if requests else None,
+                "sites": sites,
+            }
@@ -18,7 +18,7 @@ def download_ffmpeg(dest_dir=None):
     bin_dir = os.path.join(dest_dir, "bin")
     
     if os.path.exists(bin_dir) and os.path.exists(os.path.join(bin_dir, "ffmpeg.exe")):
-        logging.info(f"✅ FFmpeg already installed in: {bin_dir}")
+        logging.info("✅ FFmpeg already installed in: %s", bin_dir)
         return
 
     logging.info("⬇️ Downloading FFmpeg... (this might take a minute)")
@@ -50,10 +50,10 @@ def download_ffmpeg(dest_dir=None):
         if os.path.exists(zip_path): os.remove(zip_path)
         if os.path.exists(temp_extract): shutil.rmtree(temp_extract)
         
-        logging.info(f"✅ FFmpeg installed successfully to: {dest_dir}")
+        logging.info("✅ FFmpeg installed successfully to: %s", dest_dir)
         
     except Exception as e:
-        logging.error(f"❌ Failed to download/install FFmpeg: {e}")
+        logging.error("❌ Failed to download/install FFmpeg: %s", e)
         # Cleanup partials
         if os.path.exists(zip_path): os.remove(zip_path)
         if os.path.exists(temp_extract): shutil.rmtree(temp_extract)
@@ -1,6 +1,34 @@
 let currentSavedPath = ""; // Global tracker for the last saved file
+let currentJobId = null; // Job started from this window
 
-async function startDownload() {
+const FINAL_JOB_STATES = ['finished', 'error', 'cancelled'];
+
+// Follows a job over Server-Sent Events; each event only carries the fields that changed
+function followJob(jobId, onProgress) {
+    return new Promise((resolve, reject) => {
+        const progress = {};
+        const source = new EventSource(`/api/jobs/${jobId}/events`);
+
+        source.addEventListener('progress', (e) => {
+            Object.assign(progress, JSON.parse(e.data));
+            onProgress(progress);
+        });
+        source.addEventListener('done', (e) => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        source.onerror = () => {
+            // The stream closes after "done"; anything else is a lost connection
+            source.close();
+            fetch(`/api/jobs/${jobId}`)
+                .then(res => res.json())
+                .then(job => FINAL_JOB_STATES.includes(job.status) ? resolve(job) : resolve(followJob(jobId, onProgress)))
+                .catch(reject);
+        };
+    });
+}
+
+async function startDownload(resumeJobId = null) {
     const input = document.getElementById('urlInput');
     const btn = document.getElementById('downloadBtn');
     const btnText = document.getElementById('btnText');
@@ -13,14 +41,18 @@ async function startDownload() {
     const qualitySelect = document.getElementById('qualitySelect');
     const audioToggle = document.getElementById('audioOnlyToggle');
     const playlistToggle = document.getElementById('playlistToggle');
+    const forceToggle = document.getElementById('forceToggle');
+    const formatSelect = document.getElementById('formatSelect');
 
     const url = input.value.trim();
     const downloadDir = dirInput.value.trim();
     const quality = qualitySelect.value;
     const audio_only = audioToggle.checked;
     const download_playlist = playlistToggle.checked;
+    const force = forceToggle.checked; // Download again even if the history has it
+    const format_id = download_playlist ? null : (formatSelect.value || null);
 
-    if (!url) {
+    if (!url && !resumeJobId) {
         status.textContent = "Lütfen geçerli bir URL girin";
         status.className = "status error";
         return;
@@ -33,6 +65,7 @@ async function startDownload() {
     dirInput.disabled = true;
     audioToggle.disabled = true;
     playlistToggle.disabled = true;
+    forceToggle.disabled = true;
     btn.disabled = true;
     btnText.style.display = 'none';
     btnLoader.style.display = 'block';
@@ -52,37 +85,34 @@ async function startDownload() {
     progressInfo.innerText = "0.0MB / 0.0MB";
     progressBar.style.width = "0%";
 
-    // Polling function
-    const pollInterval = setInterval(async () => {
-        try {
-            const res = await fetch('/api/progress');
-            const data = await res.json();
-            if (data.status === 'downloading') {
-                progressPercent.innerText = data.percent;
-
-                // Show counter only if info is available to avoid "hollow circle"
-                if (data.playlist_info) {
-                    playlistCounter.innerText = data.playlist_info;
-                    playlistCounter.style.display = 'inline-block';
-                } else {
-                    playlistCounter.style.display = 'none';
-                }
-
-                downloadSpeed.innerText = data.speed;
-                progressInfo.innerText = data.size_info || "";
-                progressBar.style.width = data.percent;
-            } else if (data.status === 'merging') {
-                downloadSpeed.innerText = "Birleştiriliyor...";
-                progressInfo.innerText = "Dosya birleştiriliyor (FFmpeg)...";
-                progressBar.style.width = "100%";
+    const renderProgress = (data) => {
+        if (data.status === 'downloading') {
+            progressPercent.innerText = data.percent;
+
+            // Show counter only if info is available to avoid "hollow circle"
+            if (data.playlist_info) {
+                playlistCounter.innerText = data.playlist_info;
+                playlistCounter.style.display = 'inline-block';
+            } else {
+                playlistCounter.style.display = 'none';
             }
-        } catch (e) {
-            console.error("Progress poll failed", e);
+
+            downloadSpeed.innerText = data.speed;
+            progressInfo.innerText = data.size_info || "";
+            progressBar.style.width = data.percent;
+        } else if (data.status === 'paused') {
+            downloadSpeed.innerText = "Duraklatıldı";
+        } else if (data.status === 'waiting_for_space') {
+            downloadSpeed.innerText = "Disk alanı bekleniyor";
+        } else if (data.status === 'merging' || data.status === 'postprocessing') {
+            downloadSpeed.innerText = "Birleştiriliyor...";
+            progressInfo.innerText = "Dosya birleştiriliyor (FFmpeg)...";
+            progressBar.style.width = "100%";
         }
-    }, 800);
+    };
 
     try {
-        const response = await fetch('/api/download', {
+        const response = resumeJobId ? await fetch(`/api/resumable/${resumeJobId}/resume`, { method: 'POST' }) : await fetch('/api/jobs', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -92,27 +122,35 @@ async function startDownload() {
                 download_dir: downloadDir,
                 quality: quality,
                 audio_only: audio_only,
-                download_playlist: download_playlist
+                download_playlist: download_playlist,
+                format_id: format_id,
+                force: force
             }),
         });
 
-        const data = await response.json();
+        const created = await response.json();
+        if (!response.ok) {
+            throw new Error(created.detail || "İndirme başarısız");
+        }
+        currentJobId = created.job_id;
 
-        if (response.ok) {
-            if (data.status === "cancelled") {
-                status.textContent = "İndirme iptal edildi";
-                status.className = "status error";
-                return;
-            }
-            status.textContent = "İndirme başarılı!";
-            status.className = "status success";
-            filePath.textContent = "Kaydedildi: " + data.filename;
-            currentSavedPath = data.full_path; // Store the full absolute path
-            resultCard.classList.remove('hidden');
-            input.value = ""; // Clear input on success
-        } else {
-            throw new Error(data.detail || "İndirme başarısız");
+        const job = await followJob(currentJobId, renderProgress);
+        const data = job.result;
+
+        if (job.status === "cancelled" || job.status === "interrupted") {
+            status.textContent = data.message;
+            status.className = "status error";
+            return;
+        }
+        if (job.status === "error") {
+            throw new Error(job.error || "İndirme başarısız");
         }
+        status.textContent = data.status === "exists" ? "Bu video daha önce indirildi" : "İndirme başarılı!";
+        status.className = "status success";
+        filePath.textContent = "Kaydedildi: " + data.filename;
+        currentSavedPath = data.full_path; // Store the full absolute path
+        resultCard.classList.remove('hidden');
+        input.value = ""; // Clear input on success
     } catch (error) {
         status.textContent = error.message;
         status.className = "status error";
@@ -121,12 +159,13 @@ async function startDownload() {
         cancelBtn.disabled = false;
         cancelBtn.innerText = "İptal Et";
 
-        clearInterval(pollInterval);
+        currentJobId = null;
         progressContainer.classList.add('hidden');
         input.disabled = false;
         dirInput.disabled = false;
         audioToggle.disabled = false;
         playlistToggle.disabled = false;
+        forceToggle.disabled = false;
         btn.disabled = false;
         btnText.style.display = 'block';
         btnLoader.style.display = 'none';
@@ -135,6 +174,169 @@ async function startDownload() {
     }
 }
 
+function formatSize(bytes) {
+    if (!bytes) return "?";
+    const units = ['B', 'KB', 'MB', 'GB'];
+    let i = 0;
+    while (bytes >= 1024 && i < units.length - 1) {
+        bytes /= 1024;
+        i++;
+    }
+    return `${bytes.toFixed(1)}${units[i]}`;
+}
+
+// Loads the real format ladder of the entered URL so an exact format can be pinned
+async function loadFormats() {
+    const url = document.getElementById('urlInput').value.trim();
+    const formatField = document.getElementById('formatField');
+    const formatSelect = document.getElementById('formatSelect');
+
+    formatSelect.length = 1;
+    formatField.classList.add('hidden');
+    if (!url || document.getElementById('playlistToggle').checked) return;
+
+    try {
+        const res = await fetch(`/api/formats?url=${encodeURIComponent(url)}`);
+        if (!res.ok) return;
+        const data = await res.json();
+        if (document.getElementById('urlInput').value.trim() !== url) return;
+
+        for (const f of data.formats) {
+            const option = document.createElement('option');
+            option.value = f.download_format; // Video-only rows come paired with their audio
+            option.style.background = '#1a1a1a';
+            const codec = [f.vcodec, f.acodec].filter(Boolean).join(' + ');
+            option.textContent = [f.resolution || f.kind, f.ext, codec, formatSize(f.filesize)].filter(Boolean).join(' · ');
+            formatSelect.appendChild(option);
+        }
+        if (formatSelect.length > 1) formatField.classList.remove('hidden');
+    } catch (e) {
+        console.error("Failed to load formats", e);
+    }
+}
+
+document.getElementById('urlInput').addEventListener('change', loadFormats);
+document.getElementById('playlistToggle').addEventListener('change', loadFormats);
+
+// Offers to resume downloads that a previous session left unfinished
+async function loadResumable() {
+    const card = document.getElementById('resumeCard');
+    const list = document.getElementById('resumeList');
+    try {
+        const res = await fetch('/api/resumable');
+        const data = await res.json();
+        list.innerHTML = "";
+        for (const entry of data.jobs) {
+            const item = document.createElement('div');
+            item.className = 'resume-item';
+
+            const label = document.createElement('span');
+            label.textContent = `${entry.url} (${formatSize(entry.partial_bytes)})`;
+
+            const resumeBtn = document.createElement('button');
+            resumeBtn.textContent = "Devam Et";
+            resumeBtn.onclick = async () => {
+                item.remove();
+                if (!list.children.length) card.classList.add('hidden');
+                await startDownload(entry.job_id);
+            };
+
+            const abandonBtn = document.createElement('button');
+            abandonBtn.textContent = "Sil";
+            abandonBtn.onclick = async () => {
+                await fetch(`/api/resumable/${entry.job_id}`, { method: 'DELETE' });
+                loadResumable();
+            };
+
+            item.append(label, resumeBtn, abandonBtn);
+            list.appendChild(item);
+        }
+        card.classList.toggle('hidden', !data.jobs.length);
+    } catch (e) {
+        console.error("Failed to load resumable downloads", e);
+    }
+}
+
+const BATCH_STATUS_LABELS = {
+    pending: "Bekliyor", resolving: "Çözümleniyor", queued: "Sırada", starting: "Başlıyor",
+    downloading: "İndiriliyor", postprocessing: "İşleniyor", finished: "Tamamlandı",
+    error: "Hata", failed: "Geçersiz", cancelled: "İptal", interrupted: "Durduruldu", paused: "Duraklatıldı",
+    waiting_for_space: "Disk alanı bekleniyor"
+};
+
+// Sends a dropped URL list to the batch endpoint with the current options
+async function submitBatch(text) {
+    const status = document.getElementById('statusMessage');
+    try {
+        const res = await fetch('/api/jobs/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                text: text,
+                download_dir: document.getElementById('dirInput').value.trim(),
+                quality: document.getElementById('qualitySelect').value,
+                audio_only: document.getElementById('audioOnlyToggle').checked,
+                download_playlist: document.getElementById('playlistToggle').checked,
+                force: document.getElementById('forceToggle').checked
+            })
+        });
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.detail || "Toplu indirme başlatılamadı");
+        status.textContent = `${data.accepted} URL sıraya alındı` + (data.duplicates ? `, ${data.duplicates} tekrar atlandı` : "");
+        status.className = "status success";
+        followBatch(data.batch_id);
+    } catch (e) {
+        status.textContent = e.message;
+        status.className = "status error";
+    }
+}
+
+// Polls a batch and renders its aggregate progress and per-URL report
+async function followBatch(batchId) {
+    const card = document.getElementById('batchCard');
+    const list = document.getElementById('batchList');
+    card.classList.remove('hidden');
+    while (true) {
+        const res = await fetch(`/api/batches/${batchId}`);
+        if (!res.ok) return;
+        const batch = await res.json();
+        const done = batch.total - (batch.counts.pending || 0) - (batch.counts.resolving || 0) - (batch.counts.queued || 0)
+            - (batch.counts.starting || 0) - (batch.counts.downloading || 0) - (batch.counts.postprocessing || 0);
+        document.getElementById('batchTitle').textContent = `Toplu İndirme (${done} / ${batch.total}, ${batch.percent})`;
+        document.getElementById('batchProgressBar').style.width = batch.percent;
+
+        list.innerHTML = "";
+        for (const item of batch.items) {
+            const row = document.createElement('div');
+            row.className = 'resume-item';
+            const label = document.createElement('span');
+            label.textContent = item.title || item.url;
+            label.title = item.error || item.url;
+            const state = document.createElement('span');
+            state.style.flex = '0 0 auto';
+            state.textContent = BATCH_STATUS_LABELS[item.status] || item.status;
+            row.append(label, state);
+            list.appendChild(row);
+        }
+        if (batch.finished) return;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+const batchDrop = document.getElementById('batchDrop');
+batchDrop.addEventListener('dragover', (e) => {
+    e.preventDefault();
+    batchDrop.classList.add('dragover');
+});
+batchDrop.addEventListener('dragleave', () => batchDrop.classList.remove('dragover'));
+batchDrop.addEventListener('drop', async (e) => {
+    e.preventDefault();
+    batchDrop.classList.remove('dragover');
+    const file = e.dataTransfer.files[0];
+    const text = file ? await file.text() : e.dataTransfer.getData('text');
+    if (text) submitBatch(text);
+});
+
 async function browseFolder() {
     try {
         const response = await fetch('/api/select_folder');
@@ -152,7 +354,11 @@ async function cancelDownload() {
         const btn = document.getElementById('cancelBtn');
         btn.disabled = true;
         btn.innerText = "İptal ediliyor...";
-        await fetch('/api/cancel', { method: 'POST' });
+        if (currentJobId) {
+            await fetch(`/api/jobs/${currentJobId}/cancel`, { method: 'POST' });
+        } else {
+            await fetch('/api/cancel', { method: 'POST' });
+        }
     } catch (e) {
         console.error("Cancel failed", e);
     }
@@ -169,6 +375,7 @@ window.addEventListener('load', async () => {
         if (data.quality) {
             document.getElementById('qualitySelect').value = data.quality;
         }
+        loadResumable();
     } catch (e) {
         console.error("Failed to fetch config", e);
     }
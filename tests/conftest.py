@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# main.py creates its app data folder, config and log under the home directory on import
+_home = tempfile.mkdtemp(prefix="videoindiren-test-")
+os.environ["HOME"] = _home
+os.environ["APPDATA"] = _home
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
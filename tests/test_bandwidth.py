@@ -0,0 +1,49 @@
+import pydantic
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from bandwidth import BandwidthManager, TokenBucket
+
+@pytest.mark.parametrize("rate", [None, 0, -5])
+def test_bucket_without_positive_rate_is_unlimited(rate):
+    bucket = TokenBucket(rate)
+    assert bucket.consume(10 ** 9) == 0
+    bucket.set_rate(rate)
+    assert bucket.consume(10 ** 9) == 0
+
+def test_zero_job_limit_does_not_throttle():
+    manager = BandwidthManager(global_limit=0)
+    manager.register("job", limit=0)
+    manager.throttle("job", 10 ** 9) # would divide by zero or sleep with a zero rate
+    assert manager.snapshot()["jobs"]["job"]["rate"] is None
+
+def test_request_rejects_non_positive_limits():
+    with pytest.raises(pydantic.ValidationError):
+        main.DownloadRequest(url="https://example.com/v", rate_limit=0)
+    with pytest.raises(pydantic.ValidationError):
+        main.DownloadRequest(url="https://example.com/v", weight=0)
+    assert main.DownloadRequest(url="https://example.com/v").rate_limit is None
+
+def test_weight_change_keeps_the_job_limit(monkeypatch):
+    manager = BandwidthManager()
+    monkeypatch.setattr(main, "bandwidth_manager", manager)
+    job = main.DownloadJob(main.DownloadRequest(url="https://example.com/v", rate_limit=1000))
+    monkeypatch.setitem(main.scheduler.jobs, job.id, job)
+    manager.register(job.id, job.request.rate_limit, job.request.weight)
+    client = TestClient(main.app)
+
+    response = client.post(f"/api/jobs/{job.id}/bandwidth", json={"weight": 2}).json()
+    assert response["rate_limit"] == 1000
+    assert manager.snapshot()["jobs"][job.id] == {"limit": 1000, "weight": 2, "rate": 1000}
+
+    assert client.post(f"/api/jobs/{job.id}/bandwidth", json={"limit": 0}).json()["rate_limit"] is None
+
+def test_global_limit_only_changes_when_sent(monkeypatch):
+    manager = BandwidthManager(global_limit=5000)
+    monkeypatch.setattr(main, "bandwidth_manager", manager)
+    monkeypatch.setattr(main, "save_config", lambda **kwargs: None)
+    client = TestClient(main.app)
+    assert client.post("/api/bandwidth", json={}).json()["global_limit"] == 5000
+    assert client.post("/api/bandwidth", json={"weight": 2}).json()["global_limit"] == 5000
+    assert client.post("/api/bandwidth", json={"limit": 0}).json()["global_limit"] is None
@@ -0,0 +1,56 @@
+import pytest
+from yt_dlp.utils import DownloadError
+
+import main
+
+URL = "https://media.example.com/watch/1"
+CACHED = {"id": "1", "title": "cached", "formats": []}
+FRESH = {"id": "1", "title": "fresh", "formats": []}
+
+class FakeYoutubeDL:
+    """Fails the first download with `error`, then succeeds."""
+
+    def __init__(self, error):
+        self.job = main.DownloadJob(main.DownloadRequest(url=URL))
+        self.error = error
+        self.extracted = 0
+
+    def process_ie_result(self, info, download=True):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return info
+
+    def extract_info(self, url, download=False):
+        self.extracted += 1
+        return dict(FRESH)
+
+    def sanitize_info(self, info, remove_private_keys=False):
+        return info
+
+@pytest.fixture(autouse=True)
+def cached_metadata():
+    main.extraction_cache.put(URL, dict(CACHED))
+    yield
+    main.extraction_cache.invalidate(URL)
+
+@pytest.mark.parametrize("message", [
+    "ERROR: unable to download video data: HTTP Error 403: Forbidden",
+    "ERROR: unable to download video data: HTTP Error 410: Gone",
+    "ERROR: The stream URL has expired",
+])
+def test_stale_formats_are_extracted_again(message):
+    ydl = FakeYoutubeDL(DownloadError(message))
+    assert main.download_with_cache(ydl, URL)["title"] == "fresh"
+    assert ydl.extracted == 1
+
+@pytest.mark.parametrize("error", [
+    DownloadError("ERROR: unable to download video data: HTTP Error 503: Service Unavailable"),
+    OSError(28, "No space left on device"),
+    ValueError("DOWNLOAD_CANCELLED"),
+])
+def test_other_errors_are_raised(error):
+    ydl = FakeYoutubeDL(error)
+    with pytest.raises(type(error)):
+        main.download_with_cache(ydl, URL)
+    assert ydl.extracted == 0
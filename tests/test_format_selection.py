@@ -0,0 +1,17 @@
+from format_selection import rank_candidates
+
+def video(format_id, tbr=None, filesize=None, height=1080):
+    return {"format_id": format_id, "ext": "mp4", "vcodec": "avc1.640028", "acodec": "mp4a.40.2",
+            "height": height, "tbr": tbr, "filesize": filesize}
+
+def test_higher_bitrate_wins_over_smaller_file():
+    formats = [video("high", tbr=4000, filesize=900), video("low", tbr=2000, filesize=500)]
+    assert rank_candidates(formats)[0][0]["format_id"] == "high"
+
+def test_size_breaks_equal_bitrates():
+    formats = [video("big", tbr=3000, filesize=900), video("small", tbr=3000, filesize=500)]
+    assert rank_candidates(formats)[0][0]["format_id"] == "small"
+
+def test_height_still_comes_before_bitrate():
+    formats = [video("720", tbr=8000, height=720), video("1080", tbr=3000)]
+    assert rank_candidates(formats)[0][0]["format_id"] == "1080"
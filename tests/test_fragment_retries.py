@@ -0,0 +1,55 @@
+import time
+
+import pytest
+import yt_dlp
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.downloader.fragment import FragmentFD
+
+import main
+from fragment_concurrency import AdaptiveConcurrency
+
+ERROR = yt_dlp.utils.DownloadError("HTTP Error 503: Service Unavailable")
+
+@pytest.fixture
+def job(monkeypatch):
+    monkeypatch.setattr(main, "fragment_controller", AdaptiveConcurrency(initial=8, window=0.05))
+    return main.DownloadJob(main.DownloadRequest(url="https://media.example.com/video.m3u8"))
+
+def downloader(job, fd_class=FileDownloader):
+    """A yt-dlp downloader whose output goes to the job's logger, like during a real download."""
+    ydl = yt_dlp.YoutubeDL({'logger': main.YtdlLogger(job), 'quiet': True})
+    return fd_class(ydl, ydl.params)
+
+def test_fragment_retry_backs_off(job):
+    fd = downloader(job)
+    fd.report_retry(ERROR, 1, 10, frag_index=5)
+    time.sleep(0.06)
+    fd.report_retry(ERROR, 2, 10, frag_index=5)
+    assert job.stats["fragment_retries"] == 2
+    assert main.fragment_controller.get(job.site) < 8
+
+def test_retry_without_fragment_index_counts(job):
+    fd = downloader(job)
+    fd.report_retry(ERROR, 1, 10) # "Retrying (1/10)...", e.g. a plain HTTP download
+    fd.report_retry(ERROR, 1, 10, None) # "Retrying fragments (1/10)..."
+    assert job.stats["fragment_retries"] == 2
+
+def test_exhausted_retries_count_on_error_path(job):
+    fd = downloader(job)
+    with pytest.raises(yt_dlp.utils.DownloadError):
+        fd.report_retry(ERROR, 11, 10, frag_index=5, fatal=True)
+    assert job.stats["fragment_retries"] == 1
+    time.sleep(0.06)
+    main.fragment_controller.record_bytes(job.site, 0) # closes the window with the error in it
+    assert main.fragment_controller.get(job.site) < 8
+
+def test_skipped_fragment_counts(job):
+    downloader(job, FragmentFD).report_skip_fragment(7, "HTTP Error 503")
+    assert job.stats["fragment_retries"] == 1
+
+def test_other_output_is_ignored(job):
+    logger = main.YtdlLogger(job)
+    logger.debug("[download] Destination: video.mp4")
+    logger.debug("[download] Got error: nothing to see")
+    assert job.stats["fragment_retries"] == 0
+    assert main.fragment_controller.get(job.site) == 8
@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+@pytest.fixture
+def headless(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "HEADLESS", True)
+    monkeypatch.setattr(main, "DOWNLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+def test_headless_keeps_downloads_under_download_dir(headless):
+    assert main.checked_download_dir("music") == os.path.join(str(headless), "music")
+    assert main.checked_download_dir(str(headless / "video")) == str(headless / "video")
+    for outside in ("/etc", "../elsewhere"):
+        with pytest.raises(HTTPException):
+            main.checked_download_dir(outside)
+
+def test_headless_disables_desktop_endpoints(headless):
+    client = TestClient(main.app)
+    assert client.post("/api/open_folder", json={"file_path": str(headless)}).status_code == 403
+    assert client.post("/api/jobs", json={"url": "https://example.com/v", "download_dir": "/"}).status_code == 403
+
+def test_desktop_accepts_any_folder(monkeypatch):
+    monkeypatch.setattr(main, "HEADLESS", False)
+    assert main.checked_download_dir("/tmp") == "/tmp"
+
+def ended_job(scheduler, ended_at):
+    job = main.DownloadJob(main.DownloadRequest(url="https://example.com/v"))
+    job.set_status("finished")
+    job.mark_done()
+    job.ended_at = ended_at
+    scheduler.jobs[job.id] = job
+    return job
+
+def test_prune_drops_expired_and_excess_jobs():
+    scheduler = main.DownloadScheduler(1)
+    now = time.time()
+    expired = ended_job(scheduler, now - 7200)
+    oldest, newer, newest = (ended_job(scheduler, now - age) for age in (30, 20, 10))
+    running = main.DownloadJob(main.DownloadRequest(url="https://example.com/r"))
+    scheduler.jobs[running.id] = running
+
+    removed = scheduler.prune(retention=3600, max_ended=2)
+    assert set(removed) == {expired.id, oldest.id}
+    assert set(scheduler.jobs) == {newer.id, newest.id, running.id}
+
+def test_pruned_batch_jobs_keep_their_report(monkeypatch):
+    scheduler = main.DownloadScheduler(1)
+    monkeypatch.setattr(main, "scheduler", scheduler)
+    monkeypatch.setattr(main, "JOB_RETENTION_SECONDS", 0)
+    job = ended_job(scheduler, time.time() - 1)
+    batch = main.DownloadBatch(["https://example.com/v"], 0)
+    batch.items[0].update(status="queued", job_id=job.id)
+    monkeypatch.setattr(main, "batches", {batch.id: batch})
+
+    main.prune_ended()
+    assert scheduler.jobs == {}
+    assert main.batches == {}
+    assert batch.to_dict()["items"][0]["status"] == "finished"
@@ -0,0 +1,48 @@
+import io
+import os
+
+import pytest
+
+from range_downloader import MIN_PART_SIZE, download_ranges, range_fd_class
+
+DATA = os.urandom(2 * MIN_PART_SIZE) # Two ranges
+
+def serve(failures):
+    """open_range over DATA that fails the first `failures` requests for the second range."""
+    calls = []
+
+    def open_range(start, end):
+        calls.append(start)
+        if start > 0 and calls.count(start) <= failures:
+            raise IOError("HTTP Error 503: Service Unavailable")
+        return io.BytesIO(DATA[start:end + 1])
+    return open_range
+
+def test_transient_range_failure_is_retried(tmp_path):
+    path = tmp_path / "video.mp4.part"
+    fetched = download_ranges(serve(failures=1), str(path), len(DATA), connections=2, retries=3)
+    assert fetched == len(DATA)
+    assert path.read_bytes() == DATA
+
+def test_range_gives_up_after_retries(tmp_path):
+    with pytest.raises(IOError):
+        download_ranges(serve(failures=2), str(tmp_path / "video.mp4.part"), len(DATA), connections=2, retries=1)
+
+@pytest.mark.parametrize("info, probed", [
+    ({"filesize": 1024}, False),
+    ({"filesize_approx": 1024}, False),
+    ({"filesize": 64 * MIN_PART_SIZE}, True),
+    ({}, True),
+])
+def test_probe_only_when_the_file_may_be_split(monkeypatch, tmp_path, info, probed):
+    from yt_dlp import YoutubeDL
+    from yt_dlp.downloader.http import HttpFD
+
+    RangeSplitFD = range_fd_class()
+    calls = []
+    monkeypatch.setattr(RangeSplitFD, "probe_size", lambda self, info_dict: calls.append(info_dict) or None)
+    monkeypatch.setattr(HttpFD, "real_download", lambda self, filename, info_dict: True)
+    params = {"quiet": True, "range_connections": 4, "range_min_size": 16 * 1024 * 1024}
+    fd = RangeSplitFD(YoutubeDL(params), params)
+    assert fd.real_download(str(tmp_path / "video.mp4"), {"url": "https://example.com/v.mp4", **info})
+    assert bool(calls) == probed
@@ -0,0 +1,25 @@
+import yt_dlp
+from fastapi.testclient import TestClient
+
+import main
+from resume_journal import ResumeJournal
+
+def test_resume_pins_the_whole_merged_selection(monkeypatch, tmp_path):
+    journal = ResumeJournal(str(tmp_path / "journal.json"))
+    monkeypatch.setattr(main, "download_journal", journal)
+    job = main.DownloadJob(main.DownloadRequest(url="https://example.com/v", download_dir=str(tmp_path)))
+    journal.start(job.id, job.request.url, job.request.model_dump(exclude_none=True), str(tmp_path))
+
+    # Interrupted while the video half was downloading: only its hook fired
+    monkeypatch.setattr(main, "reserve_disk_space", lambda *args, **kwargs: None)
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "process_info", lambda self, info: None)
+    PipelinedYoutubeDL = main.downloader_classes()[0]
+    PipelinedYoutubeDL({'quiet': True}, job).process_info({'format_id': '137+140'})
+    main.track_job_file(job, str(tmp_path / "v [v].f137.mp4"))
+    journal.mark_all_interrupted()
+
+    submitted = []
+    monkeypatch.setattr(main.scheduler, "submit", lambda request: submitted.append(request) or job)
+    response = TestClient(main.app).post(f"/api/resumable/{job.id}/resume")
+    assert response.status_code == 200
+    assert submitted[0].format_id == "137+140"
@@ -16,7 +16,7 @@ def check_ffmpeg():
     # 2. Local folder check (same logic as main.py)
     local_ffmpeg = os.path.join(os.getcwd(), "ffmpeg", "bin")
     if os.path.exists(local_ffmpeg):
-        logging.info(f"INFO: Found local FFmpeg at {local_ffmpeg}. Temporarily adding to PATH for check...")
+        logging.info("INFO: Found local FFmpeg at %s. Temporarily adding to PATH for check...", local_ffmpeg)
         os.environ["PATH"] += os.pathsep + local_ffmpeg
         if shutil.which("ffmpeg"):
              logging.info("INFO: Local FFmpeg looks good.")
@@ -27,10 +27,10 @@ def check_ffmpeg():
 
 def check_ytdlp():
     try:
-        logging.info(f"✅ yt-dlp imported successfully. Version: {yt_dlp.version.__version__}")
+        logging.info("✅ yt-dlp imported successfully. Version: %s", yt_dlp.version.__version__)
         return True
     except Exception as e:
-        logging.error(f"❌ yt-dlp import failed: {e}")
+        logging.error("❌ yt-dlp import failed: %s", e)
         return False
 
 def check_download_capability():
@@ -41,13 +41,13 @@ def check_download_capability():
         'simulate': True, # Do not download
     }
     try:
-        logging.info(f"Attempting to fetch metadata for: {test_url}")
+        logging.info("Attempting to fetch metadata for: %s", test_url)
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             ydl.extract_info(test_url, download=False)
         logging.info("✅ Network and yt-dlp metadata extraction working.")
         return True
     except Exception as e:
-        logging.error(f"❌ Metadata extraction failed: {e}")
+        logging.error("❌ Metadata extraction failed: %s", e)
         return False
 
 if __name__ == "__main__":